@@ -395,8 +395,10 @@ class Schema:
             for key in instantiation_map:
                 if key not in self.templates:
                     return None
-                if is_constant(key) or is_variable(key):
-                    consts_var[key] = Term.parse(str(instantiation_map[key]))
+                if is_constant(key):
+                    consts_var[key] = instantiation_map[key]
+                if is_variable(key):
+                    consts_var[key] = Term(instantiation_map[key])
                 if is_relation(key):
                     rel[key] = instantiation_map[key]
             return Schema._instantiate_helper(self.formula, consts_var, rel , set())
@@ -6,11 +6,14 @@
 """Syntactic handling of first-order formulas and terms."""
 
 from __future__ import annotations
-from typing import AbstractSet, Mapping, Optional, Sequence, Set, Tuple, Union
+from functools import lru_cache
+from typing import AbstractSet, Dict, List, Mapping, Optional, Sequence, Set, \
+    Tuple, Union
 
 from logic_utils import fresh_variable_name_generator, frozen
 
-import copy
+import re
+import weakref
 
 from propositions.syntax import Formula as PropositionalFormula, \
                                 is_variable as is_propositional_variable
@@ -30,6 +33,32 @@ class ForbiddenVariableError(Exception):
         assert is_variable(variable_name)
         self.variable_name = variable_name
 
+def _characters(first: str, last: str) -> frozenset:
+    """Returns the set of characters between the two given ones, inclusive."""
+    return frozenset(chr(code) for code in range(ord(first), ord(last) + 1))
+
+# Characters that may start each kind of name
+_CONSTANT_HEADS = _characters('0', '9') | _characters('a', 'd')
+_VARIABLE_HEADS = _characters('u', 'z')
+_FUNCTION_HEADS = _characters('f', 't')
+_RELATION_HEADS = _characters('F', 'T')
+
+# Shared summary of names for nodes that have none of a given kind
+_EMPTY = frozenset()
+
+def _union(first: frozenset, second: frozenset) -> frozenset:
+    """Returns the union of the given sets, reusing one of them rather than
+    allocating a new set if the other one is a subset of it."""
+    if second <= first:
+        return first
+    if first <= second:
+        return second
+    return first | second
+
+# Matches a (possibly empty) run of alphanumeric characters
+_ALPHANUMERICS = re.compile(r'[^\W_]*')
+
+@lru_cache(maxsize=1024)
 def is_constant(s: str) -> bool:
     """Checks if the given string is a constant name.
 
@@ -39,9 +68,9 @@ def is_constant(s: str) -> bool:
     Returns:
         ``True`` if the given string is a constant name, ``False`` otherwise.
     """
-    return  (((s[0] >= '0' and s[0] <= '9') or (s[0] >= 'a' and s[0] <= 'd'))
-             and s.isalnum()) or s == '_'
+    return (s[0] in _CONSTANT_HEADS and s.isalnum()) or s == '_'
 
+@lru_cache(maxsize=1024)
 def is_variable(s: str) -> bool:
     """Checks if the given string is a variable name.
 
@@ -51,8 +80,9 @@ def is_variable(s: str) -> bool:
     Returns:
         ``True`` if the given string is a variable name, ``False`` otherwise.
     """
-    return s[0] >= 'u' and s[0] <= 'z' and s.isalnum()
+    return s[0] in _VARIABLE_HEADS and s.isalnum()
 
+@lru_cache(maxsize=1024)
 def is_function(s: str) -> bool:
     """Checks if the given string is a function name.
 
@@ -62,7 +92,7 @@ def is_function(s: str) -> bool:
     Returns:
         ``True`` if the given string is a function name, ``False`` otherwise.
     """
-    return s[0] >= 'f' and s[0] <= 't' and s.isalnum()
+    return s[0] in _FUNCTION_HEADS and s.isalnum()
 
 @frozen
 class Term:
@@ -87,15 +117,50 @@ class Term:
             arguments: the arguments to the root, if the root is a function
                 name.
         """
+        # String representation and hash, computed lazily
+        self._repr = None
+        self._hash = None
         if is_constant(root) or is_variable(root):
             assert arguments is None
             self.root = root
+            # Summary of names, for constants(), variables(), and functions()
+            if is_constant(root):
+                self._constants, self._variables = frozenset({root}), _EMPTY
+            else:
+                self._constants, self._variables = _EMPTY, frozenset({root})
+            self._functions = _EMPTY
         else:
             assert is_function(root)
             assert arguments is not None
             self.root = root
             self.arguments = tuple(arguments)
             assert len(self.arguments) > 0
+            # Summary of names, combined from those of the arguments
+            self._constants = \
+                _EMPTY.union(*[arg._constants for arg in self.arguments])
+            self._variables = \
+                _EMPTY.union(*[arg._variables for arg in self.arguments])
+            self._functions = \
+                frozenset({(root, len(self.arguments))}).union(
+                    *[arg._functions for arg in self.arguments])
+
+    @staticmethod
+    def leaf(root: str) -> Term:
+        """Returns the canonical term that is the given constant name or
+        variable name, so that all occurrences of the same name can share a
+        single `Term` object.
+
+        Parameters:
+            root: the constant name or variable name for the term.
+
+        Returns:
+            A term whose root is the given name.
+        """
+        term = _leaves.get(root)
+        if term is None:
+            term = Term(root)
+            _leaves[root] = term
+        return term
 
     def __repr__(self) -> str:
         """Computes the string representation of the current term.
@@ -105,20 +170,33 @@ class Term:
         """
         # Task 7.1
 
-        if is_constant(self.root) or is_variable(self.root):
-            return self.root
+        if self._repr is None:
+            parts = []
+            self._write(parts)
+            object.__setattr__(self, '_repr', "".join(parts))
+        return self._repr
 
-        to_return = self.root
-        to_return += "("
+    def _write(self, parts: List[str]) -> None:
+        """Appends the fragments of the string representation of the current
+        term to the given list.
 
-        for index , arg in enumerate(self.arguments):
-            to_return += arg.__repr__()
-            if index != len(self.arguments) - 1:
-                to_return += ","
+        Parameters:
+            parts: list to append the fragments to.
+        """
+        if self._repr is not None:
+            parts.append(self._repr)
+            return
 
-        to_return += ")"
+        parts.append(self.root)
+        if is_constant(self.root) or is_variable(self.root):
+            return
 
-        return to_return
+        parts.append("(")
+        for index, arg in enumerate(self.arguments):
+            if index != 0:
+                parts.append(",")
+            arg._write(parts)
+        parts.append(")")
 
 
     def __eq__(self, other: object) -> bool:
@@ -131,7 +209,8 @@ class Term:
             ``True`` if the given object is a `Term` object that equals the
             current term, ``False`` otherwise.
         """
-        return isinstance(other, Term) and str(self) == str(other)
+        return self is other or \
+               (isinstance(other, Term) and str(self) == str(other))
         
     def __ne__(self, other: object) -> bool:
         """Compares the current term with the given one.
@@ -146,7 +225,9 @@ class Term:
         return not self == other
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(str(self)))
+        return self._hash
 
     @staticmethod
     def parse_prefix(s: str) -> Tuple[Term, str]:
@@ -163,73 +244,35 @@ class Term:
             that entire name (and not just a part of it, such as ``'x1'``).
         """
         # Task 7.3.1
+        term, index = Term._parse_prefix(s, 0)
+        return term, s[index:]
 
-        if is_variable(s[0]):
-            if len(s) == 1:
-                return Term(s[0]), ""
-            flag = True
-            index = 1
-            for index in range(1, len(s)):
-                if s[index].isalnum():
-                    continue
-                else:
-                    flag = False
-                    break
-            if flag:
-                return Term(s[:index + 1]), ""
-            return Term(s[:index]), s[index:]
-
-        if is_constant(s[0]):
-            if len(s) == 1:
-                return Term(s[0]), ""
-
-            if s[0] == "_" and len(s) > 1:
-                return Term(s[0]), s[1:]
-
-            flag = True
-            index = 1
-            for index in range(1, len(s)):
-                if s[index].isalnum():
-                    continue
-                else:
-                    flag = False
-                    break
-            if flag:
-                return Term(s[:index + 1]), ""
-            return Term(s[:index]), s[index:]
-
-        index_open = s.find("(")
-        index = index_open + 1
-        function_name = s[:index_open]
-        counter = 1
-        opens = []
-        opens.append(index_open)
-        closed = []
-        last_one = index_open
-
-        terms = []
-
-        while (index < len(s)):
-
-            if s[index] == "(":
-                counter += 1
-                opens.append(index)
-            elif s[index] == ")":
-                counter -= 1
-                closed.append(index)
-
-            elif s[index] == "," and len(opens) < len(closed) + 2 : # check if in function
-                terms.append(Term.parse_prefix(s[last_one + 1 : index])[0])
-                last_one = index
+    @staticmethod
+    def _parse_prefix(text: str, pos: int) -> Tuple[Term, int]:
+        """Parses a term starting at the given position of the given string.
 
-            if counter == 0:
-                break
+        Parameters:
+            text: string to parse, which has a valid representation of a term
+                starting at the given position.
+            pos: position in the given string to start parsing at.
 
-            index += 1
+        Returns:
+            A pair of the parsed term and the position right after it.
+        """
+        if text[pos] == "_":
+            return Term.leaf(text[pos]), pos + 1
 
-        terms.append(Term.parse_prefix(s[last_one + 1 : index])[0])
-        return Term(function_name, terms), s[index + 1:]
+        if text[pos] in _VARIABLE_HEADS or text[pos] in _CONSTANT_HEADS:
+            index = _ALPHANUMERICS.match(text, pos + 1).end()
+            return Term.leaf(text[pos:index]), index
 
+        index_open = text.find("(", pos)
+        terms = []
+        index = index_open
+        while text[index] != ")": # At the opening parenthesis or a comma
+            term, index = Term._parse_prefix(text, index + 1)
+            terms.append(term)
+        return Term(text[pos:index_open], terms), index + 1
 
     @staticmethod
     def parse(s: str) -> Term:
@@ -245,37 +288,14 @@ class Term:
 
         return Term.parse_prefix(s)[0]
 
-    def __helper_constants__(self, constant) -> Set[str]:
-        if is_variable(self.root):
-            return constant
-        elif is_constant(self.root):
-            constant.add(self.root)
-        else:
-            for arg in self.arguments:
-                constant = arg.__helper_constants__(constant)
-        return constant
-
     def constants(self) -> Set[str]:
         """Finds all constant names in the current term.
 
         Returns:
             A set of all constant names used in the current term.
         """
-        return self.__helper_constants__(set())
-
         # Task 7.5.1
-
-    def __helper_variables__(self, variables) -> Set[str]:
-
-        if is_constant(self.root):
-            return variables
-        else:
-            if is_variable(self.root):
-                variables.add(self.root)
-            else:
-                for arg in self.arguments:
-                    variables = arg.__helper_variables__(variables)
-        return variables
+        return set(self._constants)
 
     def variables(self) -> Set[str]:
         """Finds all variable names in the current term.
@@ -283,17 +303,8 @@ class Term:
         Returns:
             A set of all variable names used in the current term.
         """
-        return self.__helper_variables__(set())
         # Task 7.5.2
-
-    def __helper_functions__(self, functions) -> Set[Tuple[str, int]]:
-        if is_variable(self.root) or is_constant(self.root):
-            return functions
-        if is_function(self.root):
-            functions.add((self.root, len(self.arguments)))
-            for arg in self.arguments:
-                functions = arg.__helper_functions__(functions)
-        return functions
+        return set(self._variables)
 
     def functions(self) -> Set[Tuple[str, int]]:
         """Finds all function names in the current term, along with their
@@ -303,24 +314,8 @@ class Term:
             A set of pairs of function name and arity (number of arguments) for
             all function names used in the current term.
         """
-        return self.__helper_functions__(set())
         # Task 7.5.3
-
-
-    def __check_all(self, term, substitute_map, forbiden_vals):
-
-        for arg in term.arguments:
-            if is_function(arg.root):
-                while is_function(arg.root):
-                    if is_function(arg.arguments[0].__repr__()):
-                        self.__check_all(arg, substitute_map, forbiden_vals)
-                        break
-                    arg = arg.arguments[0]
-
-            if arg.__repr__() in forbiden_vals:
-                raise ForbiddenVariableError(arg.__repr__())
-
-
+        return set(self._functions)
 
 
     def substitute(self, substitution_map: Mapping[str, Term],
@@ -359,31 +354,71 @@ class Term:
         for variable in forbidden_variables:
             assert is_variable(variable)
         # Task 9.1
-        new_arg = list()
-        if is_constant(self.root) or is_variable(self.root):
+        return self._substitute(
+            substitution_map, forbidden_variables,
+            _substitution_key(substitution_map, forbidden_variables), {})
 
+    def _substitute(self, substitution_map: Mapping[str, Term],
+                    forbidden_variables: AbstractSet[str], key: Tuple,
+                    cache: Dict[Tuple[int, Tuple], Term]) -> Term:
+        """Performs `substitute`, reusing the results already stored in the
+        given cache of the current top-level substitution.
 
+        Parameters:
+            substitution_map: mapping defining the substitutions to be
+                performed.
+            forbidden_variables: variables not allowed in substitution terms.
+            key: the `_substitution_key` of the two above.
+            cache: substituted subterms and subformulas of the current
+                top-level substitution, by their identity and by the `key` of
+                the substitution performed on them.
+
+        Returns:
+            The term resulting from performing all substitutions.
+        """
+        cached = cache.get((id(self), key))
+        if cached is not None:
+            return cached
+
+        if is_constant(self.root) or is_variable(self.root):
             if self.root in substitution_map:
                 to_replace = substitution_map[self.root]
+                forbidden_in_use = to_replace._variables & forbidden_variables
+                if len(forbidden_in_use) > 0:
+                    raise ForbiddenVariableError(min(forbidden_in_use))
+                result = to_replace
+            else:
+                result = self
+        else:
+            result = Term(self.root,
+                          tuple(arg._substitute(substitution_map,
+                                                forbidden_variables, key,
+                                                cache)
+                                for arg in self.arguments))
 
-                flag = is_function(to_replace.root)
-
-                if flag:
-                    self.__check_all(to_replace, substitution_map, forbidden_variables)
+        cache[(id(self), key)] = result
+        return result
 
-                elif to_replace.__repr__() in forbidden_variables:
-                    raise ForbiddenVariableError(to_replace.__repr__())
 
-                return to_replace
+_BINARY_OPERATORS = frozenset({'&', '|', '->'})
+_QUANTIFIERS = frozenset({'A', 'E'})
 
-            return self
+def _substitution_key(substitution_map: Mapping[str, Term],
+                      forbidden_variables: AbstractSet[str]) -> Tuple:
+    """Summarizes the given substitution as a hashable key.
 
-        if is_function(self.root):
-            for arg in self.arguments:
-                new_arg.append(arg.substitute(substitution_map , forbidden_variables))
-            return Term(self.root , tuple(new_arg))
+    Parameters:
+        substitution_map: mapping defining the substitutions to be performed.
+        forbidden_variables: variables not allowed in substitution terms.
 
+    Returns:
+        A key that is equal for any two equal substitutions.
+    """
+    return tuple(sorted(substitution_map.items())), \
+           tuple(sorted(forbidden_variables))
 
+# Canonical constant and variable terms that are currently in use, by name
+_leaves = weakref.WeakValueDictionary()
 
 def is_equality(s: str) -> bool:
     """Checks if the given string is the equality relation.
@@ -397,6 +432,7 @@ def is_equality(s: str) -> bool:
     """
     return s == '='
 
+@lru_cache(maxsize=1024)
 def is_relation(s: str) -> bool:
     """Checks if the given string is a relation name.
 
@@ -406,7 +442,7 @@ def is_relation(s: str) -> bool:
     Returns:
         ``True`` if the given string is a relation name, ``False`` otherwise.
     """
-    return s[0] >= 'F' and s[0] <= 'T' and s.isalnum()
+    return s[0] in _RELATION_HEADS and s.isalnum()
 
 def is_unary(s: str) -> bool:
     """Checks if the given string is a unary operator.
@@ -428,7 +464,10 @@ def is_binary(s: str) -> bool:
     Returns:
         ``True`` if the given string is a binary operator, ``False`` otherwise.
     """
-    return s == '&' or s == '|' or s == '->'
+    return s in _BINARY_OPERATORS
+
+# The binary operator starting with each character
+_BINARY_OPERATORS_BY_HEAD = {'&': '&', '|': '|', '-': '->'}
 
 def is_quantifier(s: str) -> bool:
     """Checks if the given string is a quantifier.
@@ -439,7 +478,7 @@ def is_quantifier(s: str) -> bool:
     Returns:
         ``True`` if the given string is a quantifier, ``False`` otherwise.
     """
-    return s == 'A' or s == 'E'
+    return s in _QUANTIFIERS
 
 @frozen
 class Formula:
@@ -487,6 +526,9 @@ class Formula:
                 a binary operator; the predicate quantified by the root, if the
                 root is a quantification.
         """
+        # String representation and hash, computed lazily
+        self._repr = None
+        self._hash = None
         if is_equality(root) or is_relation(root):
             # Populate self.root and self.arguments
             assert second_or_predicate is None
@@ -496,17 +538,41 @@ class Formula:
                 root, tuple(arguments_or_first_or_variable)
             if is_equality(root):
                 assert len(self.arguments) == 2
+            # Summary of names, combined from those of the arguments
+            self._constants = \
+                _EMPTY.union(*[arg._constants for arg in self.arguments])
+            self._variables = \
+                _EMPTY.union(*[arg._variables for arg in self.arguments])
+            self._free_variables = self._variables
+            self._functions = \
+                _EMPTY.union(*[arg._functions for arg in self.arguments])
+            self._relations = frozenset({(root, len(self.arguments))}) \
+                if is_relation(root) else _EMPTY
         elif is_unary(root):
             # Populate self.first
             assert isinstance(arguments_or_first_or_variable, Formula) and \
                    second_or_predicate is None
             self.root, self.first = root, arguments_or_first_or_variable
+            # Summary of names, same as that of the operand
+            first = self.first
+            self._constants, self._variables, self._free_variables, \
+                self._functions, self._relations = \
+                first._constants, first._variables, first._free_variables, \
+                first._functions, first._relations
         elif is_binary(root):
             # Populate self.first and self.second
             assert isinstance(arguments_or_first_or_variable, Formula) and \
                    second_or_predicate is not None
             self.root, self.first, self.second = \
-                root, arguments_or_first_or_variable, second_or_predicate           
+                root, arguments_or_first_or_variable, second_or_predicate
+            # Summary of names, combined from those of the operands
+            first, second = self.first, self.second
+            self._constants = _union(first._constants, second._constants)
+            self._variables = _union(first._variables, second._variables)
+            self._free_variables = \
+                _union(first._free_variables, second._free_variables)
+            self._functions = _union(first._functions, second._functions)
+            self._relations = _union(first._relations, second._relations)
         else:
             assert is_quantifier(root)
             # Populate self.variable and self.predicate
@@ -515,6 +581,15 @@ class Formula:
                    second_or_predicate is not None
             self.root, self.variable, self.predicate = \
                 root, arguments_or_first_or_variable, second_or_predicate
+            # Summary of names, that of the predicate with the quantified
+            # variable name bound
+            predicate = self.predicate
+            self._constants, self._functions, self._relations = \
+                predicate._constants, predicate._functions, \
+                predicate._relations
+            self._variables = predicate._variables | {self.variable}
+            self._free_variables = \
+                predicate._free_variables - {self.variable}
 
     def __repr__(self) -> str:
         """Computes the string representation of the current formula.
@@ -524,28 +599,53 @@ class Formula:
         """
         # Task 7.2
 
-        if is_equality(self.root):
-            return self.arguments[0].__repr__() + "=" + self.arguments[1].__repr__()
+        if self._repr is None:
+            parts = []
+            self._write(parts)
+            object.__setattr__(self, '_repr', "".join(parts))
+        return self._repr
+
+    def _write(self, parts: List[str]) -> None:
+        """Appends the fragments of the string representation of the current
+        formula to the given list.
+
+        Parameters:
+            parts: list to append the fragments to.
+        """
+        if self._repr is not None:
+            parts.append(self._repr)
+
+        elif is_equality(self.root):
+            self.arguments[0]._write(parts)
+            parts.append("=")
+            self.arguments[1]._write(parts)
 
-        if is_relation(self.root):
-            to_return = self.root + "("
+        elif is_relation(self.root):
+            parts.append(self.root)
+            parts.append("(")
             for index, arg in enumerate(self.arguments):
-                to_return += arg.__repr__()
-                if index != len(self.arguments) - 1:
-                    to_return += ","
-            to_return += ")"
-            return to_return
+                if index != 0:
+                    parts.append(",")
+                arg._write(parts)
+            parts.append(")")
 
-        if is_unary(self.root):
-            return "~" + self.first.__repr__()
+        elif is_unary(self.root):
+            parts.append("~")
+            self.first._write(parts)
 
-        if is_binary(self.root):
-            first = self.first.__repr__()
-            secd = self.second.__repr__()
-            return "(" + first + self.root + secd + ")"
+        elif is_binary(self.root):
+            parts.append("(")
+            self.first._write(parts)
+            parts.append(self.root)
+            self.second._write(parts)
+            parts.append(")")
 
-        if is_quantifier(self.root):
-            return self.root + self.variable + "[" + self.predicate.__repr__() + "]"
+        elif is_quantifier(self.root):
+            parts.append(self.root)
+            parts.append(self.variable)
+            parts.append("[")
+            self.predicate._write(parts)
+            parts.append("]")
 
 
     def __eq__(self, other: object) -> bool:
@@ -558,7 +658,8 @@ class Formula:
             ``True`` if the given object is a `Formula` object that equals the
             current formula, ``False`` otherwise.
         """
-        return isinstance(other, Formula) and str(self) == str(other)
+        return self is other or \
+               (isinstance(other, Formula) and str(self) == str(other))
         
     def __ne__(self, other: object) -> bool:
         """Compares the current formula with the given one.
@@ -573,7 +674,9 @@ class Formula:
         return not self == other
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(str(self)))
+        return self._hash
 
     @staticmethod
     def parse_prefix(s: str) -> Tuple[Formula, str]:
@@ -591,110 +694,53 @@ class Formula:
             name (and not just a part of it, such as ``'x1'``).
         """
         # Task 7.4.1
+        formula, index = Formula._parse_prefix(s, 0)
+        return formula, s[index:]
 
-        index = 0
-        open_number = 0
-        close_number = 0
-        square_open = 0
-        square_close = 0
-        operator_number = 0
-        index_close = 0
-        index_operator = 0
-        count_par = 0
-        to_return = ""
-        relation = None
-
-        if is_unary(s[0]):
-            formula = Formula.parse_prefix(s[1:])
-            return Formula("~", formula[0]), formula[1]
-
-        if is_quantifier(s[0]):
-            var = s[1:s.find("[")]
-            formula =  Formula.parse_prefix(s[s.find("[")+1:])
-            return Formula(s[0],var,formula[0]),formula[1][1:]
-
-        if is_relation(s[0]):
-            relation = s[0:s.find("(")]
-            index = s.find("(")
-
-        if s[index] == "(":
-            while (index < len(s)):
-
-                if s[index] == "(":
-                    open_number += 1
-                    count_par += 1
-                elif s[index] == ")":
-                    close_number += 1
-                    count_par -= 1
-                    index_close = index
-                elif is_binary(s[index]):
-                    operator_number += 1
-                    if count_par == 1:
-                        index_operator = index
-                elif index + 1 < len(s) and s[index:index + 2] == "->":
-                    operator_number += 1
-                    index += 1
-                    if count_par == 1:
-                        index_operator = index
-                index += 1
-
-                if open_number == close_number and square_open == square_close:
-                    to_return = s[index_close + 1:]
-                    break
-
-            if index_close != len(s) - 1:
-                to_return = s[index_close + 1:]
-
-            if relation is not None:
-                terms = []
-                counter = 0
-                opens = []
-                closed = []
-                last_one = s.find("(")
-                i = last_one
-
-                while (i < len(s)):
-
-                    if s[i] == "(":
-                        counter += 1
-                        opens.append(index)
-                    elif s[i] == ")":
-                        counter -= 1
-                        closed.append(index)
-
-                    elif s[i] == "," and len(opens) < len(closed) + 2:  # check if in function
-                        terms.append(Term.parse_prefix(s[last_one + 1: i])[0])
-                        last_one = i
-
-                    if counter == 0:
-                        break
-
-                    i += 1
-                if s[last_one + 1 : i] != "":
-                    terms.append(Term.parse_prefix(s[last_one + 1: i])[0])
-                return Formula(relation, terms), to_return
+    @staticmethod
+    def _parse_prefix(text: str, pos: int) -> Tuple[Formula, int]:
+        """Parses a formula starting at the given position of the given string.
 
-            if s[index_operator] == ">":
-                return Formula("->", Formula.parse_prefix(s[1:index_operator - 1])[0],
-                               Formula.parse_prefix(s[index_operator + 1:index_close])[0]), to_return
+        Parameters:
+            text: string to parse, which has a valid representation of a
+                formula starting at the given position.
+            pos: position in the given string to start parsing at.
 
-            return Formula(s[index_operator], Formula.parse_prefix(s[1:index_operator])[0],
-                           Formula.parse_prefix(s[index_operator + 1:index_close])[0]), to_return
+        Returns:
+            A pair of the parsed formula and the position right after it.
+        """
+        if is_unary(text[pos]):
+            formula, index = Formula._parse_prefix(text, pos + 1)
+            return Formula("~", formula), index
+
+        if is_quantifier(text[pos]):
+            index_open = text.find("[", pos)
+            formula, index = Formula._parse_prefix(text, index_open + 1)
+            return Formula(text[pos], text[pos + 1:index_open], formula), \
+                   index + 1
+
+        if text[pos] in _RELATION_HEADS:
+            index_open = text.find("(", pos)
+            terms = []
+            index = index_open
+            if text[index + 1] == ")": # No arguments
+                index += 1
+            while text[index] != ")": # At the opening parenthesis or a comma
+                term, index = Term._parse_prefix(text, index + 1)
+                terms.append(term)
+            return Formula(text[pos:index_open], terms), index + 1
 
+        if text[pos] == "(":
+            first, index = Formula._parse_prefix(text, pos + 1)
+            operator = _BINARY_OPERATORS_BY_HEAD[text[index]]
+            second, index = Formula._parse_prefix(text, index + len(operator))
+            return Formula(operator, first, second), index + 1
 
         else:
-            split_equal = s.split("=")
-            first = Term.parse_prefix(split_equal[0])[0]
-            scd = Term.parse_prefix(split_equal[1])
-            return_to = scd[1]
-            if len(split_equal)> 2:
-                for i in range(2, len(split_equal)):
-                    if i != len(split_equal):
-                        return_to += "="
-                    return_to += split_equal[i]
-            return Formula("=",[Term.parse(first.__repr__()), Term.parse(scd[0].__repr__())]),return_to
-
-
+            first, index = Term._parse_prefix(text, pos)
+            assert is_equality(text[index])
+            second, index = Term._parse_prefix(text, index + 1)
+            return Formula("=", [first, second]), index
 
     @staticmethod
     def parse(s: str) -> Formula:
@@ -710,42 +756,14 @@ class Formula:
 
         return Formula.parse_prefix(s)[0]
 
-    def __helper_constants__(self, constants) -> Set[str]:
-        if is_equality(self.root) or is_relation(self.root):
-            for arg in self.arguments:
-                constants = arg.__helper_constants__(constants)
-        if is_unary(self.root):
-            constants = self.first.__helper_constants__(constants)
-        if is_binary(self.root):
-            constants = self.first.__helper_constants__(constants)
-            constants = self.second.__helper_constants__(constants)
-        if is_quantifier(self.root):
-            constants = self.predicate.__helper_constants__(constants)
-        return constants
-
     def constants(self) -> Set[str]:
         """Finds all constant names in the current formula.
 
         Returns:
             A set of all constant names used in the current formula.
         """
-        return self.__helper_constants__(set())
         # Task 7.6.1
-
-    def __helper_variables__(self, variables) -> Set[str]:
-        if is_equality(self.root) or is_relation(self.root):
-            for arg in self.arguments:
-                variables = arg.__helper_variables__(variables)
-        if is_unary(self.root):
-            variables = self.first.__helper_variables__(variables)
-        if is_binary(self.root):
-            variables = self.first.__helper_variables__(variables)
-            variables = self.second.__helper_variables__(variables)
-        if is_quantifier(self.root):
-            for var in self.variable:
-                variables.add(var)
-            variables = self.predicate.__helper_variables__(variables)
-        return variables
+        return set(self._constants)
 
     def variables(self) -> Set[str]:
         """Finds all variable names in the current formula.
@@ -753,8 +771,8 @@ class Formula:
         Returns:
             A set of all variable names used in the current formula.
         """
-        return self.__helper_variables__(set())
         # Task 7.6.2
+        return set(self._variables)
 
     def free_variables(self) -> Set[str]:
         """Finds all variable names that are free in the current formula.
@@ -764,45 +782,7 @@ class Formula:
             within a scope of a quantification on those variable names.
         """
         # Task 7.6.3
-
-        if is_equality(self.root):
-            bad_variables1 = self.arguments[0].variables()
-            bad_variables2 = self.arguments[1].variables()
-            return bad_variables1.union(bad_variables2)
-
-        if is_quantifier(self.root):
-            bad_variables = set()
-            for var in self.variable:
-                bad_variables.add(var)
-            goods = self.predicate.free_variables()
-            return goods.difference(bad_variables)
-
-        if is_unary(self.root):
-            return self.first.free_variables()
-
-        if is_binary(self.root):
-            first_values = self.first.free_variables()
-            second_values = self.second.free_variables()
-            return first_values.union(second_values)
-
-        if is_relation(self.root):
-            values = set()
-            for arg in self.arguments:
-                values.update(arg.variables())
-            return values
-
-    def __helper_functions__(self, functions) -> Set[Tuple[str, int]]:
-        if is_equality(self.root) or is_relation(self.root):
-            for arg in self.arguments:
-                functions = arg.__helper_functions__(functions)
-        if is_unary(self.root):
-            functions = self.first.__helper_functions__(functions)
-        if is_binary(self.root):
-            functions = self.first.__helper_functions__(functions)
-            functions = self.second.__helper_functions__(functions)
-        if is_quantifier(self.root):
-            functions = self.predicate.__helper_functions__(functions)
-        return functions
+        return set(self._free_variables)
 
     def functions(self) -> Set[Tuple[str, int]]:
         """Finds all function names in the current formula, along with their
@@ -812,21 +792,8 @@ class Formula:
             A set of pairs of function name and arity (number of arguments) for
             all function names used in the current formula.
         """
-        return self.__helper_functions__(set())
-
         # Task 7.6.4
-
-    def __helper_relations__(self, relations) -> Set[Tuple[str, int]]:
-        if is_relation(self.root):
-            relations.add((self.root, len(self.arguments)))
-        if is_unary(self.root):
-            relations = self.first.__helper_relations__(relations)
-        if is_binary(self.root):
-            relations = self.first.__helper_relations__(relations)
-            relations = self.second.__helper_relations__(relations)
-        if is_quantifier(self.root):
-            relations = self.predicate.__helper_relations__(relations)
-        return relations
+        return set(self._functions)
 
     def relations(self) -> Set[Tuple[str, int]]:
         """Finds all relation names in the current formula, along with their
@@ -836,8 +803,8 @@ class Formula:
             A set of pairs of relation name and arity (number of arguments) for
             all relation names used in the current formula.
         """
-        return self.__helper_relations__(set())
         # Task 7.6.5
+        return set(self._relations)
 
 
     def substitute(self, substitution_map: Mapping[str, Term],
@@ -884,75 +851,134 @@ class Formula:
         for variable in forbidden_variables:
             assert is_variable(variable)
         # Task 9.2
-        # my_formula = copy.deepcopy(self)
-
-        if is_constant(self.root) or is_variable(self.root) or is_function(self.root):
-            return self.substitute(substitution_map, forbidden_variables)
-        elif is_unary(self.root):
-            first = self.first.substitute(substitution_map, forbidden_variables)
-            return Formula(self.root, first)
-        elif is_binary(self.root):
-            first = self.first.substitute(substitution_map, forbidden_variables)
-            second = self.second.substitute(substitution_map, forbidden_variables)
-            return Formula(self.root, first, second)
-        elif is_relation(self.root) or is_equality(self.root):
-            args = list()
-            for arg in self.arguments:
-                args.append(arg.substitute(substitution_map, forbidden_variables))
-            return Formula(self.root, args)
-        elif is_quantifier(self.root):
-
-            free = self.free_variables()
-            vars = self.variables()
-            forbids = set(forbidden_variables)
+        return self._substitute(
+            substitution_map, forbidden_variables,
+            _substitution_key(substitution_map, forbidden_variables), {})
 
-            new_dict = dict()
-            for var in self.variables():
-
-                if var in free and var in substitution_map:
-                    vars.remove(var)
-                    new_dict[var] = substitution_map[var]
-                if var not in free:
-                    forbids.add(var)
-
-            for val in substitution_map:
-                if is_constant(val):
-                    new_dict[val] = substitution_map[val]
-
-            preds = self.predicate.substitute(new_dict, forbids)
-            return Formula(self.root, self.variable, preds)
-
-        return self
-
-
-    def __helper_skeleton(self, dic):
+    def _substitute(self, substitution_map: Mapping[str, Term],
+                    forbidden_variables: AbstractSet[str], key: Tuple,
+                    cache: Dict[Tuple[int, Tuple], Union[Term, Formula]]) -> \
+                Formula:
+        """Performs `substitute`, reusing the results already stored in the
+        given cache of the current top-level substitution.
 
-        if is_relation(self.root) or is_equality(self.root) or is_quantifier(self.root):
+        Parameters:
+            substitution_map: mapping defining the substitutions to be
+                performed.
+            forbidden_variables: variables not allowed in substitution terms.
+            key: the `_substitution_key` of the two above.
+            cache: substituted subterms and subformulas of the current
+                top-level substitution, by their identity and by the `key` of
+                the substitution performed on them.
 
-            return_value = ""
+        Returns:
+            The formula resulting from performing all substitutions.
+        """
+        # Subformulas still to be substituted, each along with the
+        # substitution to perform on it and with whether the substituted
+        # subformulas that it is built from are already on top of `results`
+        stack = [(self, substitution_map, forbidden_variables, key, False)]
+        results = []
+        while len(stack) > 0:
+            formula, substitution_map, forbidden_variables, key, expanded = \
+                stack.pop()
+            root = formula.root
+            if expanded:
+                if is_unary(root):
+                    result = Formula(root, results.pop())
+                elif is_binary(root):
+                    second = results.pop()
+                    result = Formula(root, results.pop(), second)
+                else:
+                    result = Formula(root, formula.variable, results.pop())
+                cache[(id(formula), key)] = result
+                results.append(result)
+                continue
+
+            cached = cache.get((id(formula), key))
+            if cached is not None:
+                results.append(cached)
+            elif is_unary(root):
+                stack.append((formula, substitution_map, forbidden_variables,
+                              key, True))
+                stack.append((formula.first, substitution_map,
+                              forbidden_variables, key, False))
+            elif is_binary(root):
+                stack.append((formula, substitution_map, forbidden_variables,
+                              key, True))
+                stack.append((formula.second, substitution_map,
+                              forbidden_variables, key, False))
+                stack.append((formula.first, substitution_map,
+                              forbidden_variables, key, False))
+            elif is_relation(root) or is_equality(root):
+                args = list()
+                for arg in formula.arguments:
+                    args.append(arg._substitute(substitution_map,
+                                                forbidden_variables, key,
+                                                cache))
+                result = Formula(root, args)
+                cache[(id(formula), key)] = result
+                results.append(result)
+            else:
+                assert is_quantifier(root)
+
+                free = formula._free_variables
+                forbids = set(forbidden_variables)
+                forbids |= formula._variables - free
+
+                new_dict = {var: substitution_map[var] for var in free
+                            if var in substitution_map}
+                new_dict.update((name, term)
+                                for name, term in substitution_map.items()
+                                if is_constant(name))
+
+                stack.append((formula, substitution_map, forbidden_variables,
+                              key, True))
+                stack.append((formula.predicate, new_dict, forbids,
+                              _substitution_key(new_dict, forbids), False))
+
+        return results.pop()
+
+    def __helper_skeleton(self, name_by_formula, formula_by_name):
+
+        # Subformulas still to be visited, each along with whether the
+        # skeletons of the subformulas that it is built from are already on
+        # top of `results`
+        stack = [(self, False)]
+        results = []
+        while len(stack) > 0:
+            formula, expanded = stack.pop()
+
+            if expanded:
+                if is_binary(formula.root):
+                    right = results.pop()
+                    left = results.pop()
+                    results.append(PropositionalFormula(formula.root, left,
+                                                        right))
+                else:
+                    results.append(PropositionalFormula(formula.root,
+                                                        results.pop()))
 
-            flag = False
-            for key in dic.keys():
-                if dic[key] == self:
-                    return_value = key
-                    flag = True
-                    break
+            elif is_binary(formula.root):
+                stack.append((formula, True))
+                stack.append((formula.second, False))
+                stack.append((formula.first, False))
 
-            if not flag:
-                return_value = next(fresh_variable_name_generator)
-                dic[return_value] = self
+            elif is_unary(formula.root):
+                stack.append((formula, True))
+                stack.append((formula.first, False))
 
-            return PropositionalFormula(return_value), dic
+            else:
+                return_value = name_by_formula.get(formula)
 
-        if is_binary(self.root):
-            left, dic_left = self.first.__helper_skeleton(dic)
-            right, dic_right = self.second.__helper_skeleton(dic_left)
+                if return_value is None:
+                    return_value = next(fresh_variable_name_generator)
+                    name_by_formula[formula] = return_value
+                    formula_by_name[return_value] = formula
 
-            return PropositionalFormula(self.root, left, right), dic_right
+                results.append(PropositionalFormula(return_value))
 
-        if is_unary(self.root):
-            form, dic_new = self.first.__helper_skeleton(dic)
-            return PropositionalFormula(self.root, form), dic_new
+        return results.pop(), formula_by_name
 
     def propositional_skeleton(self) -> Tuple[PropositionalFormula,
                                               Mapping[str, Formula]]:
@@ -973,7 +999,7 @@ class Formula:
         """
         # Task 9.8
 
-        return self.__helper_skeleton(dict())
+        return self.__helper_skeleton(dict(), dict())
 
 
     @staticmethod
@@ -997,14 +1023,41 @@ class Formula:
             assert is_propositional_variable(key)
         # Task 9.10
 
-        if is_variable(skeleton.root):
-            return substitution_map[skeleton.root]
+        # Skeleton subformulas still to be converted, each along with whether
+        # the formulas converted from the skeletons that it is built from are
+        # already on top of `results`
+        stack = [(skeleton, False)]
+        results = []
+        # Formulas already converted from skeleton subformulas, by the
+        # identity of the latter, for skeletons that share subformulas
+        converted = dict()
+        while len(stack) > 0:
+            skeleton, expanded = stack.pop()
+
+            if is_propositional_variable(skeleton.root):
+                results.append(substitution_map[skeleton.root])
+
+            elif expanded:
+                if is_binary(skeleton.root):
+                    right = results.pop()
+                    left = results.pop()
+                    formula = Formula(skeleton.root, left, right)
+                else:
+                    formula = Formula(skeleton.root, results.pop())
+                converted[id(skeleton)] = formula
+                results.append(formula)
 
-        elif is_binary(skeleton.root):
-            left = Formula.from_propositional_skeleton(skeleton.first, substitution_map)
-            right = Formula.from_propositional_skeleton(skeleton.second, substitution_map)
-            return Formula(skeleton.root, left, right)
+            elif id(skeleton) in converted:
+                results.append(converted[id(skeleton)])
+
+            elif is_binary(skeleton.root):
+                stack.append((skeleton, True))
+                stack.append((skeleton.second, False))
+                stack.append((skeleton.first, False))
+
+            else:
+                assert is_unary(skeleton.root)
+                stack.append((skeleton, True))
+                stack.append((skeleton.first, False))
 
-        elif is_unary(skeleton.root):
-            first = Formula.from_propositional_skeleton(skeleton.first, substitution_map)
-            return Formula(skeleton.root, first)
+        return results.pop()
@@ -35,19 +35,16 @@ def prove_corollary(antecedent_proof: Proof, consequent: Formula,
                                  consequent)).is_specialization_of(conditional)
     # Task 5.3a
 
-    myLines = list()
-
-    for line in antecedent_proof.lines:
-        myLines.append(line)
+    myLines = list(antecedent_proof.lines)
 
     my_map = InferenceRule.formula_specialization_map(conditional.conclusion.second, consequent)
 
-    myLines.append(Proof.Line(conditional.specialize(my_map).conclusion, conditional, []))
-    myLines.append(Proof.Line(consequent, MP, [len(antecedent_proof.lines)-1,len(antecedent_proof.lines)]))
+    specialized = conditional.specialize(my_map).conclusion
+
+    myLines.append(Proof.Line(specialized, conditional, ()))
+    myLines.append(Proof.Line(consequent, MP, (len(antecedent_proof.lines)-1,len(antecedent_proof.lines))))
 
-    rules = list()
-    for r in antecedent_proof.rules:
-        rules.append(r)
+    rules = list(antecedent_proof.rules)
     rules.append(MP)
     rules.append(conditional)
 
@@ -96,27 +93,31 @@ def combine_proofs(antecedent1_proof: Proof, antecedent2_proof: Proof,
     lines.extend(antecedent1_proof.lines)
     my_map_1 = InferenceRule.formula_specialization_map(double_conditional.conclusion.first, antecedent1_proof.statement.conclusion)
     my_map_2 = InferenceRule.formula_specialization_map(double_conditional.conclusion.second.second, consequent)
-    my_map = InferenceRule.merge_specialization_maps(my_map_1, my_map_2)
-    lines.append(Proof.Line(double_conditional.specialize(my_map).conclusion, double_conditional, []))
-    num = len(lines) - 1
-
-    for line in antecedent2_proof.lines:
-        assumps = list()
-        if not line.is_assumption():
-            for ass in line.assumptions:
-                assumps.append(ass + num + 1)
-            lines.append(Proof.Line(line.formula, line.rule, assumps))
-        else:
-            lines.append(line)
-
-    lines.append(Proof.Line(double_conditional.specialize(my_map).conclusion.second, MP, [num -1 , num]))
-    num = len(lines) - 1
-    lines.append(Proof.Line(double_conditional.specialize(my_map).conclusion.second.second, MP, [num -1 , num]))
+    if my_map_1.keys().isdisjoint(my_map_2): # nothing to reconcile
+        my_map = {**my_map_1, **my_map_2}
+    else:
+        my_map = InferenceRule.merge_specialization_maps(my_map_1, my_map_2)
+    specialized = double_conditional.specialize(my_map).conclusion
+    lines.append(Proof.Line(specialized, double_conditional, ()))
+    num = len(antecedent1_proof.lines)
+
+    offset = num + 1
+    Line = Proof.Line # looked up once for the renumbering below
+    lines.extend(line if line.is_assumption() else
+                 Line(line.formula, line.rule,
+                      tuple(ass + offset for ass in line.assumptions))
+                 for line in antecedent2_proof.lines)
+
+    lines.append(Proof.Line(specialized.second, MP, (num -1 , num)))
+    num = offset + len(antecedent2_proof.lines)
+    lines.append(Proof.Line(specialized.second.second, MP, (num -1 , num)))
     my_state = InferenceRule(antecedent1_proof.statement.assumptions, consequent)
 
-    my_rules = antecedent1_proof.rules.union(antecedent2_proof.rules)
+    my_rules = set(antecedent1_proof.rules)
+    my_rules |= antecedent2_proof.rules
+    my_rules.add(double_conditional)
 
-    return Proof(my_state, my_rules.union({double_conditional}), lines)
+    return Proof(my_state, my_rules, lines)
 
 
 
@@ -150,68 +151,71 @@ def remove_assumption(proof: Proof) -> Proof:
     my_lines = list()
     implies = '->'
 
-    my_assumptioons = list()
-    for ass in proof.statement.assumptions:
-        if ass != working_assumption:
-            my_assumptioons.append(ass)
+    my_assumptioons = [ass for ass in proof.statement.assumptions
+                       if ass != working_assumption]
 
-    proof_to_newProof = list()
+    proof_to_newProof = [0] * len(proof.lines)
 
 
-    my_lines.append(Proof.Line(Formula(implies, working_assumption, working_assumption), I0, [])) #first line p->p
-    index_ass = len(my_lines) - 1
+    Line = Proof.Line # looked up once for the loop below
+    self_implication = Formula(implies, working_assumption, working_assumption)
+    my_lines.append(Line(self_implication, I0, ())) #first line p->p
+    index_ass = 0
+    idx = 1 # number of lines in my_lines
+
+    # line in my_lines of each formula phi for which (working_assumption->phi)
+    # was already derived, so repeated formulas are not derived again
+    derived = {working_assumption: index_ass}
 
     for index, line in enumerate(proof.lines):
 
         # if index == 0:
         #     continue
 
-        if line.formula == working_assumption:
-            proof_to_newProof.append(index_ass) #knowing line in proof to the proof to return
-            if index != 0:
-                my_lines.append(Proof.Line(Formula(implies, working_assumption, working_assumption), I0, []))
+        if line.formula in derived:
+            proof_to_newProof[index] = derived[line.formula] #knowing line in proof to the proof to return
 
         elif line.is_assumption(): #assumption so no rule
-            my_lines.append(line)
-            to_add = \
-                Proof.Line(Formula(implies, line.formula, Formula(implies, working_assumption, line.formula)), I1, [])
-            my_lines.append(to_add)
-            num = len(my_lines)
-            to_add = Proof.Line(Formula(implies, working_assumption, line.formula), MP, [num - 2, num - 1])
-            my_lines.append(to_add)
-            proof_to_newProof.append(num)
+            implication = Formula(implies, working_assumption, line.formula)
+            my_lines.extend((
+                line,
+                Line(Formula(implies, line.formula, implication), I1, ()),
+                Line(implication, MP, (idx, idx + 1))))
+            proof_to_newProof[index] = idx + 2
+            derived[line.formula] = idx + 2
+            idx += 3
 
         elif len(line.assumptions) == 0: #rule without assumption
-            my_lines.append(line)
-            to_add = \
-                Proof.Line(Formula(implies, line.formula, Formula(implies, working_assumption, line.formula)), I1, [])
-            my_lines.append(to_add)
-            num = len(my_lines)
-            to_add = Proof.Line(Formula(implies, working_assumption, line.formula), MP, [num - 2, num - 1])
-            my_lines.append(to_add)
-            proof_to_newProof.append(num)
+            implication = Formula(implies, working_assumption, line.formula)
+            my_lines.extend((
+                line,
+                Line(Formula(implies, line.formula, implication), I1, ()),
+                Line(implication, MP, (idx, idx + 1))))
+            proof_to_newProof[index] = idx + 2
+            derived[line.formula] = idx + 2
+            idx += 3
 
         else: #has a rule and assumptions
-            assumption_in_use = proof.lines[line.assumptions[0]].formula #assumption that the line uses
+            # The implications from the working assumption to the two
+            # assumptions of the line were already derived, so their formulas
+            # are reused rather than rebuilt
             first_part = Formula(implies, working_assumption, line.formula)
-            scd_part = Formula(implies, Formula(implies, working_assumption, assumption_in_use), first_part)
-            d_first = Formula(implies, assumption_in_use, line.formula)
-            d_scd = Formula(implies, working_assumption, d_first)
-            to_add = Proof.Line(Formula(implies, d_scd, scd_part), D,[])
-            my_lines.append(to_add)
-
-            num = len(my_lines)
-            to_add = Proof.Line(scd_part, MP, [proof_to_newProof[line.assumptions[1]], num - 1])
-            my_lines.append(to_add)
-
-            num = len(my_lines)
-            to_add = Proof.Line(first_part, MP, [proof_to_newProof[line.assumptions[0]], num - 1])
-            my_lines.append(to_add)
-            proof_to_newProof.append(num)
-
+            scd_part = Formula(implies, my_lines[proof_to_newProof[line.assumptions[0]]].formula, first_part)
+            d_scd = my_lines[proof_to_newProof[line.assumptions[1]]].formula
+            my_lines.extend((
+                Line(Formula(implies, d_scd, scd_part), D, ()),
+                Line(scd_part, MP, (proof_to_newProof[line.assumptions[1]], idx)),
+                Line(first_part, MP, (proof_to_newProof[line.assumptions[0]], idx + 1))))
+            proof_to_newProof[index] = idx + 2
+            derived[line.formula] = idx + 2
+            idx += 3
+
+    if proof_to_newProof[-1] != idx - 1: # the conclusion was derived earlier
+        my_lines.append(my_lines[proof_to_newProof[-1]])
 
     ccl = Formula(implies, working_assumption, proof.statement.conclusion)
-    rules = proof.rules.union({I0, I1, MP, D})
+    rules = set(proof.rules)
+    rules.update((I0, I1, MP, D))
     my_IR = InferenceRule(my_assumptioons, ccl)
 
     return Proof(my_IR, rules, my_lines)
@@ -280,25 +284,19 @@ def prove_by_contradiction(proof: Proof) -> Proof:
     first_part = Formula("->", i0_in_use, last_assump.first)
     scd_part = Formula("->", working_proof.statement.conclusion, first_part)
 
-    my_lines = list()
-
-    for line in working_proof.lines:
-        my_lines.append(line)
+    my_lines = list(working_proof.lines)
 
     #adding the lines we need
-    my_lines.append(Proof.Line(scd_part, N, []))
+    my_lines.append(Proof.Line(scd_part, N, ()))
     num = len(my_lines) - 1
-    my_lines.append(Proof.Line(first_part, MP, [num - 1, num]))
-    my_lines.append(Proof.Line(i0_in_use, I0, []))
+    my_lines.append(Proof.Line(first_part, MP, (num - 1, num)))
+    my_lines.append(Proof.Line(i0_in_use, I0, ()))
     num = len(my_lines) - 1
-    my_lines.append(Proof.Line(last_assump.first, MP, [num, num - 1]))
+    my_lines.append(Proof.Line(last_assump.first, MP, (num, num - 1)))
 
     my_rules = { MP, I0, I1, D, N, NI} # NI ? added for the test
 
-    assumps = list()
-    for i in range(len(proof.statement.assumptions)): #without the last one
-        if i != len(proof.statement.assumptions) - 1:
-            assumps.append(proof.statement.assumptions[i])
+    assumps = proof.statement.assumptions[:-1] #without the last one
 
     my_statement = InferenceRule(assumps, last_assump.first)
 
@@ -6,8 +6,9 @@
 """Proofs by deduction in propositional logic."""
 
 from __future__ import annotations
-from typing import AbstractSet, Iterable, FrozenSet, List, Mapping, Optional, \
-    Set, Tuple, Union
+from functools import lru_cache
+from typing import AbstractSet, Dict, Iterable, FrozenSet, List, Mapping, \
+    Optional, Set, Tuple, Union
 
 from logic_utils import frozen
 
@@ -40,6 +41,8 @@ class InferenceRule:
         """
         self.assumptions = tuple(assumptions)
         self.conclusion = conclusion
+        self._repr = None
+        self._hash = None
 
     def __eq__(self, other: object) -> bool:
         """Compares the current inference rule with the given one.
@@ -51,6 +54,8 @@ class InferenceRule:
             ``True`` if the given object is an `InferenceRule` object that
             equals the current inference rule, ``False`` otherwise.
         """
+        if self is other:
+            return True
         return (isinstance(other, InferenceRule) and
                 self.assumptions == other.assumptions and
                 self.conclusion == other.conclusion)
@@ -69,7 +74,10 @@ class InferenceRule:
         return not self == other
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        if self._hash is None:
+            object.__setattr__(self, '_hash',
+                               hash((self.assumptions, self.conclusion)))
+        return self._hash
 
     def __repr__(self) -> str:
         """Computes a string representation of the current inference rule.
@@ -77,8 +85,12 @@ class InferenceRule:
         Returns:
             A string representation of the current inference rule.
         """
-        return str([str(assumption) for assumption in self.assumptions]) + \
-               ' ==> ' + "'" + str(self.conclusion) + "'"
+        if self._repr is None:
+            object.__setattr__(
+                self, '_repr',
+                str([str(assumption) for assumption in self.assumptions]) +
+                ' ==> ' + "'" + str(self.conclusion) + "'")
+        return self._repr
 
     def variables(self) -> Set[str]:
         """Finds all atomic propositions (variables) in the current inference
@@ -90,12 +102,8 @@ class InferenceRule:
         """
         # Task 4.1
 
-        my_set = set()
-
-        for formula in self.assumptions:
-            my_set = formula.find_variables(my_set)
-        my_set = self.conclusion.find_variables(my_set)
-        return my_set
+        return self.conclusion.variables().union(
+            *(assumption.variables() for assumption in self.assumptions))
 
     def specialize(self, specialization_map: SpecializationMap) -> \
             InferenceRule:
@@ -148,19 +156,11 @@ class InferenceRule:
         if specialization_map1 is None or specialization_map2 is None:
             return None
 
-        spe_map = {}
+        spe_map = dict(specialization_map1)
 
-        for var in specialization_map1:
-            if var in specialization_map2 and specialization_map1[var] == specialization_map2[var]:
-                spe_map[var] = specialization_map1[var]
-            if var in specialization_map2 and specialization_map1[var] != specialization_map2[var]:
+        for var, formula in specialization_map2.items():
+            if spe_map.setdefault(var, formula) != formula:
                 return None  # Not the same mapping for same value
-            if var not in specialization_map2:
-                spe_map[var] = specialization_map1[var]
-
-        for var in specialization_map2:
-            if var not in specialization_map1:
-                spe_map[var] = specialization_map2[var]
 
         return spe_map
 
@@ -180,22 +180,50 @@ class InferenceRule:
         """
         # Task 4.5b
 
-        if is_variable(general.root):
-            return {general.root: specialization}
+        spe_map = _formula_specialization_map(general, specialization)
+        return None if spe_map is None else dict(spe_map)
 
-        if is_constant(general.root) and general.root == specialization.root:
-            return {}
+    @staticmethod
+    def _extend_specialization_map(general: Formula, specialization: Formula,
+                                   specialization_map: Dict[str, Formula]) -> \
+            bool:
+        """Adds to the given specialization map the entries by which the given
+        formula specializes to the given specialization.
 
-        if general.root != specialization.root:
-            return None
+        Parameters:
+            general: non-specialized formula for which to compute the entries.
+            specialization: specialization for which to compute the entries.
+            specialization_map: map to add the entries to, which may already
+                contain entries for other formulas.
 
-        if is_unary(general.root):
-            return InferenceRule.formula_specialization_map(general.first, specialization.first)
+        Returns:
+            ``True`` if `specialization` is a specialization of `general` that
+            agrees with the entries already in the given map, ``False``
+            otherwise. In the latter case the given map may have been partially
+            extended.
+        """
+        # Pairs of corresponding subformulas still to be matched
+        stack = [(general, specialization)]
+        while len(stack) > 0:
+            general, specialization = stack.pop()
+            root = general.root
+
+            if is_variable(root):
+                if specialization_map.setdefault(root, specialization) != \
+                        specialization:
+                    return False
+
+            elif root != specialization.root:
+                return False
 
-        if is_binary(general.root):
-            first = InferenceRule.formula_specialization_map(general.first, specialization.first)
-            secd = InferenceRule.formula_specialization_map(general.second, specialization.second)
-            return InferenceRule.merge_specialization_maps(first, secd)
+            elif is_unary(root):
+                stack.append((general.first, specialization.first))
+
+            elif is_binary(root):
+                stack.append((general.second, specialization.second))
+                stack.append((general.first, specialization.first))
+
+        return True
 
     def specialization_map(self, specialization: InferenceRule) -> \
             Union[SpecializationMap, None]:
@@ -211,19 +239,8 @@ class InferenceRule:
         """
         # Task 4.5c
 
-        if len(self.assumptions) != len(specialization.assumptions):
-            return None
-
-        spe_map = {}
-
-        for i in range(len(self.assumptions)):
-            to_add = InferenceRule.formula_specialization_map(self.assumptions[i], specialization.assumptions[i])
-            spe_map = InferenceRule.merge_specialization_maps(spe_map, to_add)
-
-        to_add = InferenceRule.formula_specialization_map(self.conclusion, specialization.conclusion)
-        spe_map = InferenceRule.merge_specialization_maps(spe_map, to_add)
-
-        return spe_map
+        spe_map = _rule_specialization_map(self, specialization)
+        return None if spe_map is None else dict(spe_map)
 
     def is_specialization_of(self, general: InferenceRule) -> bool:
         """Checks if the current inference rule is a specialization of the given
@@ -236,7 +253,61 @@ class InferenceRule:
             ``True`` if the current inference rule is a specialization of
             `general`, ``False`` otherwise.
         """
-        return general.specialization_map(self) is not None
+        return general._matches(self, {})
+
+    def _matches(self, specialization: InferenceRule,
+                 specialization_map: Dict[str, Formula]) -> bool:
+        """Adds to the given specialization map the entries by which the
+        current inference rule specializes to the given specialization.
+
+        Parameters:
+            specialization: specialization for which to compute the entries.
+            specialization_map: map to add the entries to.
+
+        Returns:
+            ``True`` if `specialization` is a specialization of the current
+            rule, ``False`` otherwise. In the latter case the given map may
+            have been partially extended.
+        """
+        if len(self.assumptions) != len(specialization.assumptions):
+            return False
+
+        for i in range(len(self.assumptions)):
+            if not InferenceRule._extend_specialization_map(
+                    self.assumptions[i], specialization.assumptions[i],
+                    specialization_map):
+                return False
+
+        return InferenceRule._extend_specialization_map(
+            self.conclusion, specialization.conclusion, specialization_map)
+
+
+# The two functions below compute the specialization maps of formulas and of
+# inference rules, and keep the most recent ones since the same rules and
+# lines are matched again and again while proofs are checked and inlined.
+# Their results are shared between calls and so must not be modified.
+
+@lru_cache(maxsize=4096)
+def _formula_specialization_map(general: Formula, specialization: Formula) \
+        -> Optional[Dict[str, Formula]]:
+    """Computes `InferenceRule.formula_specialization_map` into a map that is
+    shared between calls."""
+    spe_map = {}
+    if not InferenceRule._extend_specialization_map(general, specialization,
+                                                    spe_map):
+        return None
+    return spe_map
+
+@lru_cache(maxsize=4096)
+def _rule_specialization_map(general: InferenceRule,
+                             specialization: InferenceRule) -> \
+        Optional[Dict[str, Formula]]:
+    """Computes `InferenceRule.specialization_map` into a map that is shared
+    between calls."""
+    spe_map = {}
+    if not general._matches(specialization, spe_map):
+        return None
+    return spe_map
 
 
 @frozen
@@ -270,6 +341,8 @@ class Proof:
         self.statement = statement
         self.rules = frozenset(rules)
         self.lines = tuple(lines)
+        self._assumption_set = frozenset(statement.assumptions)
+        self._valid = None
 
     @frozen
     class Line:
@@ -320,6 +393,7 @@ class Proof:
             self.rule = rule
             if assumptions is not None:
                 self.assumptions = tuple(assumptions)
+            self._repr = None
 
         def __repr__(self) -> str:
             """Computes a string representation of the current proof line.
@@ -327,13 +401,16 @@ class Proof:
             Returns:
                 A string representation of the current proof line.
             """
-            if self.rule is None:
-                return str(self.formula)
-            else:
-                return str(self.formula) + ' Inference Rule ' + \
-                       str(self.rule) + \
-                       ((" on " + str(self.assumptions))
-                        if len(self.assumptions) > 0 else '')
+            if self._repr is None:
+                if self.rule is None:
+                    r = str(self.formula)
+                else:
+                    r = str(self.formula) + ' Inference Rule ' + \
+                        str(self.rule) + \
+                        ((" on " + str(self.assumptions))
+                         if len(self.assumptions) > 0 else '')
+                object.__setattr__(self, '_repr', r)
+            return self._repr
 
         def is_assumption(self) -> bool:
             """Checks if the current proof line is justified as an assumption of
@@ -413,9 +490,10 @@ class Proof:
         my_line = self.lines[line_number]
 
         if my_line.is_assumption():
-            return my_line.formula in self.statement.assumptions
+            return my_line.formula in self._assumption_set
 
-        if not my_line.rule in self.rules:
+        if not my_line.rule in self.rules or \
+                len(my_line.assumptions) != len(my_line.rule.assumptions):
             return False
 
         for index in my_line.assumptions:
@@ -440,13 +518,48 @@ class Proof:
         """
         # Task 4.6c
 
-        for index in range(len(self.lines)):
-            if not self.is_line_valid(index):
-                return False
+        if self._valid is None:
+            object.__setattr__(self, '_valid', self._check_validity())
+        return self._valid
+
+    def _check_validity(self) -> bool:
+        """Checks if the current proof is a valid proof of its claimed statement
+        via its inference rules, without consulting the result cached by
+        `is_valid`.
 
+        Returns:
+            ``True`` if the current proof is a valid proof of its claimed
+            statement via its inference rules, ``False`` otherwise.
+        """
         if self.lines[-1].formula != self.statement.conclusion:
             return False
 
+        # The formulas of all lines, read once, since each line looks up the
+        # formulas of the lines it cites
+        formulas = [line.formula for line in self.lines]
+
+        # Same checks as is_line_valid, cheapest first, so that an inference
+        # rule for a line is only built when the line may still be valid
+        for index, line in enumerate(self.lines):
+            if line.is_assumption():
+                if line.formula not in self._assumption_set:
+                    return False
+                continue
+
+            if line.rule not in self.rules or \
+                    len(line.assumptions) != len(line.rule.assumptions):
+                return False
+
+            for assumption in line.assumptions:
+                if assumption >= index:
+                    return False
+
+            if not line.rule._matches(
+                    InferenceRule([formulas[assumption]
+                                   for assumption in line.assumptions],
+                                  formulas[index]), {}):
+                return False
+
         return True
 
 
@@ -469,15 +582,20 @@ def prove_specialization(proof: Proof, specialization: InferenceRule) -> Proof:
     # Task 5.1
 
     my_map = proof.statement.specialization_map(specialization)
-    my_lines = list()
-
-    for line in proof.lines:
+    substituted = {} # by the identity of the formula substituted into
 
-        if line.is_assumption():
-            my_lines.append(Proof.Line(line.formula.substitute_variables(my_map)))
+    def substitute(formula: Formula) -> Formula:
+        result = substituted.get(id(formula))
+        if result is None:
+            result = formula.substitute_variables(my_map)
+            substituted[id(formula)] = result
+        return result
 
-        else:  # rule and assumptions are optionnal
-            my_lines.append(Proof.Line(line.formula.substitute_variables(my_map), line.rule, line.assumptions))
+    # rule and assumptions are optionnal
+    my_lines = [Proof.Line(substitute(line.formula)) if line.is_assumption()
+                else Proof.Line(substitute(line.formula), line.rule,
+                                line.assumptions)
+                for line in proof.lines]
 
     return Proof(specialization, proof.rules, my_lines)
 
@@ -510,10 +628,39 @@ def inline_proof_once(main_proof: Proof, line_number: int, lemma_proof: Proof) \
     assert lemma_proof.is_valid()
     # Task 5.2a
 
+    return _inline_proof_once(main_proof, line_number, lemma_proof,
+                              main_proof.rules.union(lemma_proof.rules))
+
+
+def _inline_proof_once(main_proof: Proof, line_number: int,
+                       lemma_proof: Proof, rules: FrozenSet[InferenceRule]) \
+        -> Proof:
+    """Performs `inline_proof_once`, with the given set of allowed inference
+    rules for the returned proof.
+
+    Parameters:
+        main_proof: valid proof to inline into.
+        line: index of the line in `main_proof` that should be replaced.
+        lemma_proof: valid proof of the inference rule of the specified line (an
+            allowed inference rule of `main_proof`).
+        rules: the allowed inference rules of the returned proof.
+
+    Returns:
+        A valid proof obtained by replacing the specified line in `main_proof`
+        with a full (specialized) list of lines proving the formula of the
+        specified line, with the given allowed inference rules.
+    """
     new_lines = list()
     add_lines = 0
     lemma_lines = prove_specialization(lemma_proof, main_proof.rule_for_line(line_number))
 
+    # Index of the last line before the specified line that derives each
+    # formula by an inference rule
+    derived_before = {proof_line.formula: counter
+                      for counter, proof_line
+                      in enumerate(main_proof.lines[:line_number])
+                      if not proof_line.is_assumption()}
+
     for index in range(len(main_proof.lines)):
 
         if index < line_number:  # up to line number - 1
@@ -522,42 +669,36 @@ def inline_proof_once(main_proof: Proof, line_number: int, lemma_proof: Proof) \
         if index == line_number:  # line number
             for line in lemma_lines.lines:
                 add_lines += 1
-                if line.is_assumption() and line in main_proof.statement.assumptions:
+                if line.is_assumption() and \
+                        line.formula in main_proof._assumption_set:
                     new_lines.append(line)
-                elif line.is_assumption() and line not in main_proof.statement.assumptions:
-                    proof_to_use = None
-                    counter = 0
-                    for proof_line in main_proof.lines:
-                        if proof_line.formula == line.formula and not proof_line.is_assumption() and counter < line_number:
-                            proof_to_use = proof_line
-                        counter += 1
+                elif line.is_assumption():
+                    counter = derived_before.get(line.formula)
+                    proof_to_use = None if counter is None else \
+                        main_proof.lines[counter]
                     if proof_to_use is None:
                         new_lines.append(line)
                     else:
                         new_lines.append(Proof.Line(line.formula, proof_to_use.rule, proof_to_use.assumptions))
 
                 else:
-                    list_assump = list()
-                    for i in range(len(line.assumptions)):
-                        list_assump.append(line.assumptions[i] + line_number)
-                    new_lines.append(Proof.Line(line.formula, line.rule, tuple(list_assump)))
+                    new_lines.append(Proof.Line(
+                        line.formula, line.rule,
+                        tuple(assumption + line_number
+                              for assumption in line.assumptions)))
 
         if index > line_number:  # from line number + 1
             if main_proof.lines[index].is_assumption():
                 new_lines.append(main_proof.lines[index])
             else:
-                list_assump = list()
-                for i in range(len(main_proof.lines[index].assumptions)):
-                    if main_proof.lines[index].assumptions[i] >= line_number:
-                        num = main_proof.lines[index].assumptions[i] + add_lines - 1
-                        list_assump.append(num)
-                    else:
-                        num = main_proof.lines[index].assumptions[i]
-                        list_assump.append(num)
-                new_lines.append(
-                    Proof.Line(main_proof.lines[index].formula, main_proof.lines[index].rule, tuple(list_assump)))
+                new_lines.append(Proof.Line(
+                    main_proof.lines[index].formula,
+                    main_proof.lines[index].rule,
+                    tuple(assumption + add_lines - 1
+                          if assumption >= line_number else assumption
+                          for assumption in main_proof.lines[index].assumptions)))
 
-    return Proof(main_proof.statement, main_proof.rules.union(lemma_proof.rules), new_lines)
+    return Proof(main_proof.statement, rules, new_lines)
 
 
 def inline_proof(main_proof: Proof, lemma_proof: Proof) -> Proof:
@@ -581,19 +722,22 @@ def inline_proof(main_proof: Proof, lemma_proof: Proof) -> Proof:
     # Task 5.2b
 
     index = 0
+    # the lemma stays allowed until all its usages are inlined
+    rules = main_proof.rules | lemma_proof.rules
 
     while (index < len(main_proof.lines)):
 
-        inf_rule = main_proof.rule_for_line(index)
+        line = main_proof.lines[index]
 
-        if inf_rule is not None and inf_rule.is_specialization_of(lemma_proof.statement):
-            working_proof = inline_proof_once(main_proof, index, lemma_proof)
-            main_proof = Proof(working_proof.statement, working_proof.rules.difference({lemma_proof.statement}),
-                               working_proof.lines)
+        if not line.is_assumption() and line.rule == lemma_proof.statement:
+            main_proof = _inline_proof_once(main_proof, index, lemma_proof,
+                                            rules)
             index += len(lemma_proof.lines)
 
             continue
 
         index += 1
 
-    return main_proof
\ No newline at end of file
+    # the lemma is dropped from the rules once, after all its usages are gone
+    return Proof(main_proof.statement, rules - {lemma_proof.statement},
+                 main_proof.lines)
\ No newline at end of file
@@ -0,0 +1,160 @@
+# File name: propositions/sat.py
+
+"""Satisfiability checking of propositional formulae by the DPLL procedure."""
+
+from collections import Counter
+from typing import FrozenSet, List, Optional
+
+from propositions.syntax import *
+
+Clause = FrozenSet[int]
+
+def to_cnf(formula: Formula) -> List[Clause]:
+    """Converts the given formula into an equisatisfiable set of clauses, by
+    naming each of its operator subformulas with a fresh variable (the Tseitin
+    encoding).
+
+    Parameters:
+        formula: formula to convert.
+
+    Returns:
+        A list of clauses, each a set of nonzero integers, where a positive
+        integer `i` stands for the `i`\ th variable and ``-i`` for its
+        negation. The clauses are satisfiable together iff the given formula
+        is satisfiable.
+    """
+    clauses = list()
+    numbers = dict() # the number of each variable, and of 'T'
+    count = 0
+    stack = list()
+    for root in formula.compile():
+        if is_variable(root) or is_constant(root):
+            name = 'T' if is_constant(root) else root
+            if name not in numbers:
+                count += 1
+                numbers[name] = count
+                if name == 'T':
+                    clauses.append(frozenset({count}))
+            stack.append(-numbers[name] if root == 'F' else numbers[name])
+            continue
+        if is_unary(root):
+            stack[-1] = -stack[-1]
+            continue
+
+        second = stack.pop()
+        first = stack.pop()
+        count += 1
+        gate = count
+        if root in {'&', '-&'}: # gate <-> (first & second)
+            clauses.extend((frozenset({-gate, first}),
+                            frozenset({-gate, second}),
+                            frozenset({gate, -first, -second})))
+        elif root in {'|', '-|'}: # gate <-> (first | second)
+            clauses.extend((frozenset({gate, -first}),
+                            frozenset({gate, -second}),
+                            frozenset({-gate, first, second})))
+        elif root == '->': # gate <-> (~first | second)
+            clauses.extend((frozenset({gate, first}),
+                            frozenset({gate, -second}),
+                            frozenset({-gate, -first, second})))
+        else: # gate <-> (first + second)
+            clauses.extend((frozenset({-gate, first, second}),
+                            frozenset({-gate, -first, -second}),
+                            frozenset({gate, -first, second}),
+                            frozenset({gate, first, -second})))
+        if root in {'-&', '-|', '<->'}:
+            gate = -gate
+        stack.append(gate)
+
+    clauses.append(frozenset({stack[0]}))
+    return clauses
+
+def _assign(clauses: List[Clause], literal: int) -> Optional[List[Clause]]:
+    """Simplifies the given clauses under the assumption that the given
+    literal is true.
+
+    Parameters:
+        clauses: clauses to simplify.
+        literal: literal assumed to be true.
+
+    Returns:
+        The clauses that are not yet satisfied, without the negation of the
+        given literal, or ``None`` if one of the clauses became empty.
+    """
+    simplified = list()
+    for clause in clauses:
+        if literal in clause:
+            continue
+        if -literal in clause:
+            clause = clause - {-literal}
+            if len(clause) == 0:
+                return None
+        simplified.append(clause)
+    return simplified
+
+def _propagate(clauses: List[Clause]) -> Optional[List[Clause]]:
+    """Assigns every literal that is forced by a unit clause, and every pure
+    literal, in the given clauses.
+
+    Parameters:
+        clauses: clauses to simplify.
+
+    Returns:
+        The clauses left after the assignments, or ``None`` if they turned out
+        to be unsatisfiable.
+    """
+    while len(clauses) > 0:
+        unit = next((clause for clause in clauses if len(clause) == 1), None)
+        if unit is not None:
+            clauses = _assign(clauses, next(iter(unit)))
+            if clauses is None:
+                return None
+            continue
+
+        literals = set().union(*clauses)
+        pure = [literal for literal in literals if -literal not in literals]
+        if len(pure) == 0:
+            break
+        for literal in pure: # never empties a clause
+            clauses = _assign(clauses, literal)
+    return clauses
+
+def is_satisfiable_cnf(clauses: List[Clause]) -> bool:
+    """Checks if the given clauses are satisfiable together, by the DPLL
+    procedure.
+
+    Parameters:
+        clauses: clauses to check, in the form returned by `to_cnf`.
+
+    Returns:
+        ``True`` if some assignment satisfies all of the given clauses,
+        ``False`` otherwise.
+    """
+    pending = [clauses]
+    while len(pending) > 0:
+        clauses = _propagate(pending.pop())
+        if clauses is None:
+            continue
+        if len(clauses) == 0:
+            return True
+
+        # branch on the most frequent literal, trying it first
+        counts = Counter(literal for clause in clauses for literal in clause)
+        literal = max(counts, key=counts.__getitem__)
+        for branch in (-literal, literal):
+            simplified = _assign(clauses, branch)
+            if simplified is not None:
+                pending.append(simplified)
+    return False
+
+def dpll(formula: Formula) -> bool:
+    """Checks if the given formula is satisfiable, without going over all of
+    the models over its variables.
+
+    Parameters:
+        formula: formula to check.
+
+    Returns:
+        ``True`` if the given formula is satisfiable, ``False`` otherwise.
+    """
+    return is_satisfiable_cnf(to_cnf(formula))
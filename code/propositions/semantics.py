@@ -7,15 +7,35 @@
 
 
 
-from typing import AbstractSet, Iterable, Iterator, List, Mapping
+from functools import lru_cache
+from typing import AbstractSet, Callable, Iterable, Iterator, List, Mapping, \
+    Tuple
 
 from propositions.syntax import *
 from propositions.proofs import *
+from propositions.sat import dpll
 import itertools
+import weakref
 
 Model = Mapping[str, bool]
 SEPARATOR = "|"
 
+# Largest number of variables for which a whole truth table is computed,
+# beyond it satisfiability is checked by the DPLL procedure instead
+_MAX_TABLE_VARIABLES = 16
+
+# Negations of atomic propositions that are currently in use, by name
+_negated_leaves = weakref.WeakValueDictionary()
+
+# Truth value of each binary operator given the truth values of its operands
+_BINARY_OPERATIONS = {'|': lambda first, second: first or second,
+                      '&': lambda first, second: first and second,
+                      '->': lambda first, second: not first or second,
+                      '-|': lambda first, second: not (first or second),
+                      '-&': lambda first, second: not (first and second),
+                      '+': lambda first, second: first != second,
+                      '<->': lambda first, second: first == second}
+
 def is_model(model: Model) -> bool:
     """Checks if the given dictionary a model over some set of variables.
 
@@ -57,47 +77,57 @@ def evaluate(formula: Formula, model: Model) -> bool:
     assert is_model(model)
     assert formula.variables().issubset(variables(model))
     # Task 2.1
-    if is_variable(formula.__repr__()): #checking if just a variable
-        return model[formula.root]
+    stack = list()
+    for root in formula.compile():
+        if is_variable(root):
+            stack.append(model[root])
+        elif root == "T":
+            stack.append(True)
+        elif root == "F":
+            stack.append(False)
+        elif is_unary(root):
+            stack[-1] = not stack[-1]
+        else:
+            second = stack.pop()
+            stack[-1] = _BINARY_OPERATIONS[root](stack[-1], second)
+    return stack[0]
 
-    if is_constant(formula.__repr__()):
-        if formula.root == "T": #checking the value
-            return True
-        return False
-
-    if is_unary(formula.root):
-        return not evaluate(formula.first, model)
-
-    if is_binary(formula.root):
-        if formula.root == "|":
-            return (evaluate(formula.first, model) or evaluate(formula.second, model))
-        if formula.root == "&":
-            return (evaluate(formula.first, model) and evaluate(formula.second, model))
-        if formula.root == "->": # "->" operator
-            first_bool = evaluate(formula.first, model)
-            secd_bool = evaluate(formula.second, model)
-
-            if not first_bool or secd_bool :
-                return True
-            return False
-        if formula.root == "-|":
-            return not (evaluate(formula.first, model) or evaluate(formula.second, model))
-        if formula.root == "-&":
-            return not (evaluate(formula.first, model) and evaluate(formula.second, model))
-        if formula.root == "+":
-            first_bool = evaluate(formula.first, model)
-            secd_bool = evaluate(formula.second, model)
-
-            if (not first_bool and secd_bool) or (first_bool and not secd_bool):
-                return True
-            return False
-        if formula.root == "<->":
-            first_bool = evaluate(formula.first, model)
-            secd_bool = evaluate(formula.second, model)
+# Python expression computing each binary operator from its operands
+_PYTHON_BINARY_EXPRESSIONS = {'|': "({} or {})", '&': "({} and {})",
+                              '->': "(not {} or {})", '-|': "(not ({} or {}))",
+                              '-&': "(not ({} and {}))", '+': "({} != {})",
+                              '<->': "({} == {})"}
 
-            if (first_bool and secd_bool) or (not first_bool and not secd_bool):
-                return True
-            return False
+@lru_cache(maxsize=1024)
+def _evaluator(formula: Formula) -> Callable[[Model], bool]:
+    """Compiles the given formula into a Python function that calculates its
+    truth value in a given model.
+
+    Parameters:
+        formula: formula to compile.
+
+    Returns:
+        A function from models over (possibly a superset of) the variables of
+        the given formula to the truth value of the formula in them.
+    """
+    stack = list()
+    for root in formula.compile():
+        if is_variable(root):
+            stack.append("m['" + root + "']")
+        elif is_constant(root):
+            stack.append("True" if root == "T" else "False")
+        elif is_unary(root):
+            stack[-1] = "(not " + stack[-1] + ")"
+        else:
+            second = stack.pop()
+            stack[-1] = _PYTHON_BINARY_EXPRESSIONS[root].format(stack[-1],
+                                                                second)
+    try:
+        return eval(compile("lambda m: " + stack[0], "<formula>", "eval"),
+                    {'__builtins__': {}})
+    except (SyntaxError, RecursionError, MemoryError):
+        # too deeply nested for the Python compiler
+        return lambda model: evaluate(formula, model)
 
 
 def all_models(variables: List[str]) -> Iterable[Model]:
@@ -118,19 +148,9 @@ def all_models(variables: List[str]) -> Iterable[Model]:
     for v in variables:
         assert is_variable(v)
     # Task 2.2
-    list_dicts = list()
     my_list = [False, True]
-    combinations = list(itertools.product(my_list, repeat = len(variables)))
-    for combi in combinations:
-        dict_combi = dict()
-        index = 0
-        for var in variables :
-            dict_combi[var] = combi[index]
-            index += 1
-        index = 0
-        list_dicts.append(dict_combi)
-        dict_combi = dict()
-    return list_dicts
+    for combi in itertools.product(my_list, repeat = len(variables)):
+        yield dict(zip(variables, combi))
 
 
 
@@ -170,37 +190,104 @@ def print_truth_table(formula: Formula) -> None:
         | T | T   | F        |
     """
     # Task 2.4
-    str_print = ""
-    flag_first = False
-    variables = sorted(list(formula.variables()))
+    parts = list()
+    variables = sorted(formula.variables())
+    repr_formula = formula.__repr__()
     for var in variables:
-        str_print += (SEPARATOR + " " + var + " ")
-    str_print += (SEPARATOR + " " + formula.__repr__() + " " + SEPARATOR + "\n")
-    for var in formula.variables():
-        str_print += (SEPARATOR + "-"*(len(var) + 2))
-    str_print += (SEPARATOR + "-"*(len(formula.__repr__()) + 2) + SEPARATOR + "\n")
-    models = all_models(variables)
-    for model in models:
-        if flag_first:
-            str_print += "\n"
-        bool_answer = evaluate(formula, model)
-        for var in variables :
-            str_print += SEPARATOR + " "
-            if model[var]:
-                str_print += "T"
-            else :
-                str_print += "F"
-            str_print += " " * len(var)
-        str_print += SEPARATOR + " "
-        if bool_answer:
-            str_print += "T"
-        else:
-            str_print += "F"
-        str_print += " " * len(formula.__repr__()) + SEPARATOR
-        flag_first = True
-    print(str_print)
+        parts.append(SEPARATOR + " " + var + " ")
+    parts.append(SEPARATOR + " " + repr_formula + " " + SEPARATOR + "\n")
+    for var in variables:
+        parts.append(SEPARATOR + "-"*(len(var) + 2))
+    parts.append(SEPARATOR + "-"*(len(repr_formula) + 2) + SEPARATOR)
+    # the F and T cells of each column, indexed by the truth value
+    cells = [(SEPARATOR + " F" + " " * len(var),
+              SEPARATOR + " T" + " " * len(var)) for var in variables]
+    padding = " " * len(repr_formula) + SEPARATOR
+    formula_cells = (SEPARATOR + " F" + padding, SEPARATOR + " T" + padding)
+    mask = _formula_mask(formula)[0]
+    for index, combi in enumerate(itertools.product((0, 1),
+                                                    repeat = len(variables))):
+        parts.append("\n")
+        parts.extend(cell[value] for cell, value in zip(cells, combi))
+        parts.append(formula_cells[(mask >> index) & 1])
+    print("".join(parts))
+
+
+
+def _variable_masks(variables: List[str]) -> Mapping[str, int]:
+    """Calculates, for each of the given variables, the bitmask of the models
+    in which it is assigned ``True``.
+
+    Parameters:
+        variables: list of variables over which the models are taken.
+
+    Returns:
+        A dictionary mapping each of the given variables to an integer whose
+        `k`\ th bit is set iff the variable is ``True`` in the `k`\ th model
+        returned by `all_models`\ ``(``\ `~_variable_masks.variables`\ ``)``.
+    """
+    n = len(variables)
+    full = (1 << (1 << n)) - 1
+    masks = dict()
+    for index, var in enumerate(variables):
+        half = 1 << (n - 1 - index)
+        period = (1 << (2 * half)) - 1
+        # the upper half of each period of 2*half models, tiled over all models
+        masks[var] = (((1 << half) - 1) << half) * (full // period)
+    return masks
+
+def _truth_mask(formula: Formula, masks: Mapping[str, int], full: int) -> int:
+    """Calculates the truth values of the given formula in all models at once.
+
+    Parameters:
+        formula: formula to calculate the truth values of.
+        masks: bitmask of each variable of the formula, as returned by
+            `_variable_masks`.
+        full: bitmask with a set bit for each of the models.
+
+    Returns:
+        An integer whose `k`\ th bit is set iff the given formula is ``True`` in
+        the `k`\ th model.
+    """
+    root = formula.root
+    if is_variable(root):
+        return masks[root]
+    if root == "T":
+        return full
+    if root == "F":
+        return 0
+    if is_unary(root):
+        return full ^ _truth_mask(formula.first, masks, full)
+    first = _truth_mask(formula.first, masks, full)
+    second = _truth_mask(formula.second, masks, full)
+    if root == "|":
+        return first | second
+    if root == "&":
+        return first & second
+    if root == "->":
+        return (full ^ first) | second
+    if root == "-|":
+        return full ^ (first | second)
+    if root == "-&":
+        return full ^ (first & second)
+    if root == "+":
+        return first ^ second
+    return full ^ (first ^ second) # "<->" operator
+
+def _formula_mask(formula: Formula) -> Tuple[int, int]:
+    """Calculates the truth table of the given formula as a bitmask.
 
+    Parameters:
+        formula: formula to calculate the truth table of.
 
+    Returns:
+        A pair of the bitmask of the truth values of the given formula in all
+        models over its variables, and the bitmask with a set bit for each of
+        these models.
+    """
+    variables = sorted(formula.variables())
+    full = (1 << (1 << len(variables))) - 1
+    return _truth_mask(formula, _variable_masks(variables), full), full
 
 def is_tautology(formula: Formula) -> bool:
     """Checks if the given formula is a tautology.
@@ -212,11 +299,10 @@ def is_tautology(formula: Formula) -> bool:
         ``True`` if the given formula is a tautology, ``False`` otherwise.
     """
     # Task 2.5a
-    truth_table = truth_values(formula, all_models(formula.variables()))
-    for val in truth_table:
-        if not val :
-            return False
-    return True
+    if len(formula.variables()) > _MAX_TABLE_VARIABLES:
+        return not dpll(Formula("~", formula))
+    mask, full = _formula_mask(formula)
+    return mask == full
 
 def is_contradiction(formula: Formula) -> bool:
     """Checks if the given formula is a contradiction.
@@ -241,18 +327,30 @@ def is_satisfiable(formula: Formula) -> bool:
         ``True`` if the given formula is satisfiable, ``False`` otherwise.
     """
     # Task 2.5c
-    truth_table = truth_values(formula, all_models(formula.variables()))
-    for val in truth_table:
-        if val :
-            return True
-    return False
+    if len(formula.variables()) > _MAX_TABLE_VARIABLES:
+        return dpll(formula)
+    mask, full = _formula_mask(formula)
+    return mask != 0
 
-def __create_dnf__(forms):
+def _literal(variable: str, value: bool) -> Formula:
+    """Returns the shared formula that holds exactly in the models that assign
+    the given value to the given variable.
 
-    if len(forms) == 1:
-        return forms[0]
-    return Formula("&", forms[0], __create_dnf__(forms[1:]))
+    Parameters:
+        variable: variable of the formula.
+        value: truth value of the variable.
 
+    Returns:
+        The formula ``'``\ `variable`\ ``'`` if the given value is ``True``,
+        otherwise the formula ``'~``\ `variable`\ ``'``.
+    """
+    if value:
+        return Formula.leaf(variable)
+    literal = _negated_leaves.get(variable)
+    if literal is None:
+        literal = Formula("~", Formula.leaf(variable))
+        _negated_leaves[variable] = literal
+    return literal
 
 def synthesize_for_model(model: Model) -> Formula:
     """Synthesizes a propositional formula in the form of a single clause that
@@ -267,19 +365,21 @@ def synthesize_for_model(model: Model) -> Formula:
     """
     assert is_model(model)
     # Task 2.6
-    forms = list()
-    for var in model:
-        if not model[var]:
-            forms.append(Formula("~", Formula(var)))
-        else :
-            forms.append(Formula(var))
-    return __create_dnf__(forms)
+    formula = None
+    for var in reversed(model): # the clause is nested to the right
+        literal = _literal(var, model[var])
+        if formula is None:
+            formula = literal
+        else:
+            formula = Formula("&", literal, formula)
+    return formula
 
 def __create_cnf__(forms):
 
-    if len(forms) == 1:
-        return forms[0]
-    return Formula("|", forms[0], __create_cnf__(forms[1:]))
+    formula = forms[-1]
+    for index in range(len(forms) - 2, -1, -1):
+        formula = Formula("|", forms[index], formula)
+    return formula
 
 def synthesize(variables: List[str], values: Iterable[bool]) -> Formula:
     """Synthesizes a propositional formula in DNF over the given variables, from
@@ -307,15 +407,12 @@ def synthesize(variables: List[str], values: Iterable[bool]) -> Formula:
     assert len(variables) > 0
     # Task 2.7
 
-    options = all_models(variables)
     forms = list()
-    index = 0
     bool_flag = True #If only false values
-    for val in values:
+    for model, val in zip(all_models(variables), values):
         if val:
             bool_flag = False
-            forms.append(synthesize_for_model(options[index]))
-        index += 1
+            forms.append(synthesize_for_model(model))
 
     if bool_flag : #Only false values return an always false formula
         return Formula("&",Formula(variables[0]), Formula("~", Formula(variables[0])))  # (x&~x) false formula
@@ -338,34 +435,11 @@ def evaluate_inference(rule: InferenceRule, model: Model) -> bool:
     assert is_model(model)
     # Task 4.2
 
-    false_flag = False
-
     for assump in rule.assumptions:
+        if not evaluate(assump, model): # the rule holds vacuously
+            return True
 
-        assump = Formula.parse_prefix(str(assump))[0] #Check if a formula is given
-
-        if assump not in model:
-            to_check = evaluate(assump, model)
-
-        else:
-            to_check = model[str(assump)]
-
-        if to_check == False :
-            false_flag = True
-
-
-    ccl = Formula.parse_prefix(str(rule.conclusion))[0]  # Check if a formula is given
-
-    if ccl not in model:
-        ccl_to_check = evaluate(rule.conclusion, model)
-
-    else:
-        ccl_to_check = model[str(rule.conclusion)]
-
-    if ccl_to_check == False and not false_flag:
-        return False
-
-    return True
+    return evaluate(rule.conclusion, model)
 
 def is_sound_inference(rule: InferenceRule) -> bool:
     """Checks if the given inference rule is sound, i.e., whether its
@@ -383,8 +457,10 @@ def is_sound_inference(rule: InferenceRule) -> bool:
         return is_tautology(rule.conclusion)
 
 
+    assumptions = [_evaluator(assump) for assump in rule.assumptions]
+    conclusion = _evaluator(rule.conclusion)
     for model in all_models(rule.variables()):
-        bool_flag = evaluate_inference(rule, model)
-        if not bool_flag:
+        if not conclusion(model) and \
+                all(assump(model) for assump in assumptions):
             return False
     return True
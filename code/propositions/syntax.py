@@ -10,6 +10,16 @@ from typing import Mapping, Optional, Set, Tuple, Union
 
 from logic_utils import frozen
 
+import weakref
+
+# Possible first characters of an atomic proposition
+_VARIABLE_HEADS = frozenset(chr(code) for code in range(ord('p'), ord('z') + 1))
+_CONSTANTS = frozenset({'T', 'F'})
+_BINARY_OPERATORS = frozenset({'&', '|',  '->', '+', '<->', '-&', '-|'})
+
+# Canonical constant and variable formulas that are currently in use, by name
+_leaves = weakref.WeakValueDictionary()
+
 def is_variable(s: str) -> bool:
     """Checks if the given string is an atomic proposition.
 
@@ -20,7 +30,7 @@ def is_variable(s: str) -> bool:
         ``True`` if the given string is an atomic proposition, ``False``
         otherwise.
     """
-    return s[0] >= 'p' and s[0] <= 'z' and (len(s) == 1 or s[1:].isdigit())
+    return s[0] in _VARIABLE_HEADS and (len(s) == 1 or s[1:].isdigit())
 
 def is_constant(s: str) -> bool:
     """Checks if the given string is a constant.
@@ -31,7 +41,7 @@ def is_constant(s: str) -> bool:
     Returns:
         ``True`` if the given string is a constant, ``False`` otherwise.
     """
-    return s == 'T' or s == 'F'
+    return s in _CONSTANTS
 
 def is_unary(s: str) -> bool:
     """Checks if the given string is a unary operator.
@@ -55,7 +65,10 @@ def is_binary(s: str) -> bool:
     """
     # return s == '&' or s == '|' or s == '->'
     # For Chapter 3:
-    return s in {'&', '|',  '->', '+', '<->', '-&', '-|'}
+    return s in _BINARY_OPERATORS
+
+# Binary operators, so that none of them is listed after a prefix of it
+_BINARY_OPERATORS_LONGEST_FIRST = ('<->', '->', '-&', '-|', '&', '|', '+')
 
 
 @frozen
@@ -95,6 +108,28 @@ class Formula:
             assert is_binary(root) and type(first) is Formula and \
                    type(second) is Formula
             self.root, self.first, self.second = root, first, second
+        self._postfix = None
+        self._repr = None
+        self._hash = None
+        self._variables = None
+
+    @staticmethod
+    def leaf(root: str) -> Formula:
+        """Returns the canonical formula that is the given constant or atomic
+        proposition, so that all occurrences of the same name can share a
+        single `Formula` object.
+
+        Parameters:
+            root: the constant or atomic proposition for the formula.
+
+        Returns:
+            A formula whose root is the given name.
+        """
+        formula = _leaves.get(root)
+        if formula is None:
+            formula = Formula(root)
+            _leaves[root] = formula
+        return formula
 
     def __eq__(self, other: object) -> bool:
         """Compares the current formula with the given one.
@@ -106,7 +141,8 @@ class Formula:
             ``True`` if the given object is a `Formula` object that equals the
             current formula, ``False`` otherwise.
         """
-        return isinstance(other, Formula) and str(self) == str(other)
+        return self is other or \
+               (isinstance(other, Formula) and str(self) == str(other))
 
     def __ne__(self, other: object) -> bool:
         """Compares the current formula with the given one.
@@ -121,7 +157,9 @@ class Formula:
         return not self == other
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        if self._hash is None:
+            object.__setattr__(self, '_hash', hash(str(self)))
+        return self._hash
 
 
 
@@ -133,13 +171,40 @@ class Formula:
         """
         # Task 1.1
 
-        if is_variable(self.root) or is_constant(self.root):
-            return self.root
-        elif is_unary(self.root):
-            return self.root + self.first.__repr__()
-        else :
-            return "(" + self.first.__repr__() + self.root + self.second.__repr__() + ")"
+        if self._repr is None:
+            if is_variable(self.root) or is_constant(self.root):
+                my_repr = self.root
+            elif is_unary(self.root):
+                my_repr = self.root + self.first.__repr__()
+            else :
+                my_repr = "(" + self.first.__repr__() + self.root + self.second.__repr__() + ")"
+            object.__setattr__(self, '_repr', my_repr)
+        return self._repr
+
 
+    def compile(self) -> Tuple[str, ...]:
+        """Computes the postfix (reverse polish) form of the current formula.
+
+        Returns:
+            The roots of all the subformulas of the current formula in
+            post-order, i.e., each operator follows the roots of its operands.
+        """
+        if self._postfix is None:
+            postfix = list()
+            stack = [self]
+            while stack:
+                formula = stack.pop()
+                postfix.append(formula.root)
+                if is_unary(formula.root):
+                    stack.append(formula.first)
+                elif is_binary(formula.root):
+                    stack.append(formula.first)
+                    stack.append(formula.second)
+            # the second operand was visited first, so reversing the visit
+            # order puts the first operand before the second one
+            postfix.reverse()
+            object.__setattr__(self, '_postfix', tuple(postfix))
+        return self._postfix
 
     def find_variables(self, var_set):
 
@@ -161,8 +226,11 @@ class Formula:
             A set of all atomic propositions used in the current formula.
         """
         # Task 1.2
-        var_set = set()
-        return self.find_variables(var_set)
+        if self._variables is None:
+            var_set = set()
+            object.__setattr__(self, '_variables',
+                               frozenset(self.find_variables(var_set)))
+        return set(self._variables)
 
     def __find_operators(self, op_set):
         if is_constant(self.root):
@@ -189,18 +257,6 @@ class Formula:
         op_set = set()
         return self.__find_operators(op_set)
 
-    @staticmethod
-    def __parse_var(index, my_list) -> Tuple[str, int]:
-        my_str = my_list[index]
-        index += 1
-        while ( index < len(my_list)):
-            if my_list[index].isdigit():
-                my_str += my_list[index]
-                index += 1
-            else :
-                break
-        return my_str, index
-
     @staticmethod
     def parse_prefix(s: str) -> Tuple[Union[Formula, None], str]:
         """Parses a prefix of the given string into a formula.
@@ -219,100 +275,66 @@ class Formula:
         """
         # Task 1.4
 
-        to_parse = [char for char in s]
-        index = 0
-        open_number = 0
-        close_number = 0
-        operator_number = 0
-        index_close = 0
-        index_operator = 0
-        count_par = 0
-        to_return = ""
-
-
-        if(len(to_parse) == 0): #For an empty string
+        if(len(s) == 0): #For an empty string
             return (None, "Empty string")
 
-        if len(to_parse) == 1:
-            if is_variable(to_parse[0]) or is_constant(to_parse[0]):
-                return (Formula(to_parse[0]), "")
-            else:
-                return (None, "Invalid variable")
+        formula, index = Formula.__parse_prefix(s, 0)
+        if formula is None:
+            return formula, index # index holds the error message
+        return formula, s[index:]
 
-        if is_unary(to_parse[index]):
-            formula = Formula.parse_prefix(s[1:])
-            if formula[0] is None:
-                return None, "Unary signe is alone"
-            return Formula("~", formula[0]), formula[1]
-
-        if is_variable(to_parse[0]):
-            my_var = Formula.__parse_var(index, to_parse)
-            return (Formula(my_var[0]),s[my_var[1]:])
-
-        if is_constant(to_parse[index]):
-            return Formula(to_parse[index]), s[index+1:]
-
-        while (index < len(s)):
-
-            if to_parse[index] == "(":
-                open_number += 1
-                count_par += 1
-            elif to_parse[index] == ")":
-                close_number += 1
-                count_par -=1
-                index_close = index
-            elif is_binary(to_parse[index]):
-                operator_number += 1
-                if count_par == 1:
-                    index_operator = index
-            elif (index + 1 < len(s) and
-                      (s[index:index+2] == "->" or s[index:index+2] == "-&" or s[index:index+2] == "-|")):
-                operator_number += 1
-                index += 1
-                if count_par == 1:
-                    index_operator = index
-            elif (index + 2 < len(s) and s[index:index+3] == "<->"):
-                operator_number += 1
-                index += 1
-                if count_par == 1:
-                    index_operator = index
-            elif (index+1 < len(s) and s[index] == "-" and (s[index+1] != ">" or s[index+1] != "&" or s[index+1] != "|")):
-                return None, "Not a valid operator"
-            elif (index+2 < len(s) and s[index] == "<" and (s[index+1] != "-" or s[index+2] != ">")):
-                return None, "Not a valid operator"
-            index += 1
-
-            if open_number == close_number:
-                to_return = s[index_close+1:]
-                break
+    @staticmethod
+    def __parse_prefix(text: str, pos: int) -> Tuple[Union[Formula, None],
+                                                      Union[int, str]]:
+        """Parses a formula starting at the given position of the given string.
 
+        Parameters:
+            text: string to parse.
+            pos: position in the given string to start parsing at.
 
-        if open_number != operator_number or close_number != operator_number:
-            return (None, "Not same operator number than () number")
+        Returns:
+            A pair of the parsed formula and the position right after it, or of
+            ``None`` and an error message if no formula starts at the given
+            position.
+        """
+        if pos == len(text):
+            return None, "Unexpected end of string"
 
+        if is_variable(text[pos]):
+            index = pos + 1
+            while index < len(text) and text[index].isdigit():
+                index += 1
+            return Formula(text[pos:index]), index
 
-        if index_close != len(s)-1:
-            to_return = s[index_close+1:]
+        if is_constant(text[pos]):
+            return Formula(text[pos]), pos + 1
 
-        if to_parse[index_operator] == ">":
-            return Formula("->", Formula.parse_prefix(s[1:index_operator-1])[0],
-                           Formula.parse_prefix(s[index_operator+1:index_close])[0]) , to_return
+        if is_unary(text[pos]):
+            formula, index = Formula.__parse_prefix(text, pos + 1)
+            if formula is None:
+                return None, "Unary signe is alone"
+            return Formula("~", formula), index
 
-        if to_parse[index_operator] == "-":
-            return Formula("<->", Formula.parse_prefix(s[1:index_operator-1])[0],
-                           Formula.parse_prefix(s[index_operator+2:index_close])[0]) , to_return
+        if text[pos] != "(":
+            return None, "Invalid variable"
 
-        if to_parse[index_operator] == "&" and to_parse[index_operator-1] == "-":
-            return Formula("-&", Formula.parse_prefix(s[1:index_operator-1])[0],
-                           Formula.parse_prefix(s[index_operator+1:index_close])[0]) , to_return
+        first, index = Formula.__parse_prefix(text, pos + 1)
+        if first is None:
+            return first, index
 
-        if to_parse[index_operator] == "|" and to_parse[index_operator-1] == "-":
-            return Formula("-|", Formula.parse_prefix(s[1:index_operator-1])[0],
-                           Formula.parse_prefix(s[index_operator+1:index_close])[0]) , to_return
+        for operator in _BINARY_OPERATORS_LONGEST_FIRST:
+            if text.startswith(operator, index):
+                break
+        else:
+            return None, "Not a valid operator"
 
+        second, index = Formula.__parse_prefix(text, index + len(operator))
+        if second is None:
+            return second, index
 
-        return Formula(to_parse[index_operator], Formula.parse_prefix(s[1:index_operator])[0],
-                       Formula.parse_prefix(s[index_operator+1:index_close])[0]) , to_return
+        if index == len(text) or text[index] != ")":
+            return None, "Not same operator number than () number"
+        return Formula(operator, first, second), index + 1
 
 
     @staticmethod
@@ -391,15 +413,40 @@ class Formula:
             assert is_variable(variable)
         # Task 3.3
 
-        if self.root in substitution_map: #just a constant
-            return substitution_map[self.root] # already a formula
-        if is_unary(self.root): # ~x
-            return Formula(self.root, self.first.substitute_variables(substitution_map))
-        if is_binary(self.root):
-            return Formula(self.root, self.first.substitute_variables(substitution_map),
-                           self.second.substitute_variables(substitution_map))
-
-        return Formula(self.root) # If not in substitution map or is_constant()
+        if substitution_map.keys().isdisjoint(self.variables()):
+            return self # nothing to substitute
+
+        # substituted subformulas by id, each shared subformula is done once
+        substituted = dict()
+        stack = [self]
+        while stack:
+            formula = stack[-1]
+            if id(formula) in substituted:
+                stack.pop()
+            elif formula.root in substitution_map:
+                substituted[id(formula)] = substitution_map[formula.root]
+                stack.pop()
+            elif is_unary(formula.root): # ~x
+                if id(formula.first) in substituted:
+                    substituted[id(formula)] = Formula(
+                        formula.root, substituted[id(formula.first)])
+                    stack.pop()
+                else:
+                    stack.append(formula.first)
+            elif is_binary(formula.root):
+                if id(formula.first) in substituted and \
+                        id(formula.second) in substituted:
+                    substituted[id(formula)] = Formula(
+                        formula.root, substituted[id(formula.first)],
+                        substituted[id(formula.second)])
+                    stack.pop()
+                else:
+                    stack.append(formula.first)
+                    stack.append(formula.second)
+            else: # If not in substitution map or is_constant()
+                substituted[id(formula)] = formula
+                stack.pop()
+        return substituted[id(self)]
 
     def substitute_operators(
             self, substitution_map: Mapping[str, Formula]) -> Formula:
@@ -427,21 +474,48 @@ class Formula:
             assert substitution_map[operator].variables().issubset({'p', 'q'})
         # Task 3.4
 
-        if is_constant(self.root) and self.root in substitution_map: # T or F operators
-            return substitution_map[self.root]
-
-        if is_unary(self.root):
-            if self.root in substitution_map:
-                return substitution_map[self.root].substitute_variables(
-                    {'p':self.first.substitute_operators(substitution_map)})
-            return Formula(self.root, self.first.substitute_operators(substitution_map))
-
-        if is_binary(self.root):
-            if self.root in substitution_map:
-                return substitution_map[self.root].substitute_variables(
-                    {'p': self.first.substitute_operators(substitution_map),
-                     'q' : self.second.substitute_operators(substitution_map)})
-
-            return Formula(self.root, self.first.substitute_operators(substitution_map),
-                           self.second.substitute_operators(substitution_map))
-        return self
\ No newline at end of file
+        if substitution_map.keys().isdisjoint(self.operators()):
+            return self # nothing to substitute
+
+        # substituted subformulas by id, each shared subformula is done once
+        substituted = dict()
+        stack = [self]
+        while stack:
+            formula = stack[-1]
+            if id(formula) in substituted:
+                stack.pop()
+            elif is_unary(formula.root):
+                if id(formula.first) not in substituted:
+                    stack.append(formula.first)
+                    continue
+                first = substituted[id(formula.first)]
+                if formula.root in substitution_map:
+                    substituted[id(formula)] = \
+                        substitution_map[formula.root].substitute_variables(
+                            {'p': first})
+                else:
+                    substituted[id(formula)] = Formula(formula.root, first)
+                stack.pop()
+            elif is_binary(formula.root):
+                if id(formula.first) not in substituted or \
+                        id(formula.second) not in substituted:
+                    stack.append(formula.first)
+                    stack.append(formula.second)
+                    continue
+                first = substituted[id(formula.first)]
+                second = substituted[id(formula.second)]
+                if formula.root in substitution_map:
+                    substituted[id(formula)] = \
+                        substitution_map[formula.root].substitute_variables(
+                            {'p': first, 'q': second})
+                else:
+                    substituted[id(formula)] = Formula(formula.root, first,
+                                                       second)
+                stack.pop()
+            elif formula.root in substitution_map: # T or F operators
+                substituted[id(formula)] = substitution_map[formula.root]
+                stack.pop()
+            else:
+                substituted[id(formula)] = formula
+                stack.pop()
+        return substituted[id(self)]
\ No newline at end of file
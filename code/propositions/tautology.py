@@ -5,7 +5,10 @@
 
 """The Tautology Theorem and its implications."""
 
-from typing import List, Union
+from functools import lru_cache
+from typing import Callable, Dict, List, Mapping, Optional, Tuple, Union
+import itertools
+import weakref
 
 from logic_utils import frozendict
 
@@ -13,9 +16,36 @@ from propositions.syntax import *
 from propositions.proofs import *
 from propositions.deduction import *
 from propositions.semantics import *
+from propositions.semantics import _literal, _variable_masks
 from propositions.operators import *
 from propositions.axiomatic_systems import *
 
+# Formulae built while proving that are currently in use, keyed by their root
+# and operands, so that equal formulae built over and over again are a single
+# shared object
+_formulae = weakref.WeakValueDictionary()
+
+def _formula(root: str, first: Formula,
+             second: Optional[Formula] = None) -> Formula:
+    """Returns the shared formula with the given root and operands.
+
+    Parameters:
+        root: unary or binary operator at the root of the formula.
+        first: the first operand to the root.
+        second: the second operand to the root, if the root is a binary
+            operator.
+
+    Returns:
+        A formula with the given root and operands, which is the same object
+        for all calls with equal arguments while it is in use.
+    """
+    key = (root, first, second)
+    formula = _formulae.get(key)
+    if formula is None:
+        formula = Formula(root, first, second)
+        _formulae[key] = formula
+    return formula
+
 def formulae_capturing_model(model: Model) -> List[Formula]:
     """Computes the formulae that capture the given model: ``'``\ `x`\ ``'``
     for each variable `x` that is assigned the value ``True`` in the given
@@ -36,15 +66,20 @@ def formulae_capturing_model(model: Model) -> List[Formula]:
     assert is_model(model)
     # Task 6.1a
 
-    model_return = list()
+    return list(_formulae_capturing_items(tuple(sorted(model.items()))))
 
-    for val in sorted(model):
-        if model[val]:
-            model_return.append(Formula(val))
-        else:
-            model_return.append(Formula("~", Formula(val)))
+@lru_cache(maxsize=4096)
+def _formulae_capturing_items(items: Tuple[Tuple[str, bool], ...]) -> \
+        Tuple[Formula, ...]:
+    """Computes the formulae that capture the model with the given items.
+
+    Parameters:
+        items: the items of the model, sorted by variable name.
 
-    return model_return
+    Returns:
+        The formulae returned by `formulae_capturing_model` for the model.
+    """
+    return tuple([_literal(val, value) for val, value in items])
 
 def prove_in_model(formula: Formula, model:Model) -> Proof:
     """Either proves the given formula or proves its negation, from the formulae
@@ -66,43 +101,86 @@ def prove_in_model(formula: Formula, model:Model) -> Proof:
     assert is_model(model)
     # Task 6.1b
 
-    model_use = formulae_capturing_model(model) #updating model
+    # the truth values in the model, as truth tables over this single model
+    tables = _subformula_tables(
+        formula, {var: int(model[var]) for var in formula.variables()}, 1)
+    return _proof_in_model(
+        formula, model, lambda subformula: _table_value(tables, subformula, 0),
+        dict())
+
+def _proof_in_model(formula: Formula, model: Model,
+                    value: Callable[[Formula], bool],
+                    proofs: Dict[Formula, Proof]) -> Proof:
+    """Computes the proof returned by `prove_in_model` for the given formula
+    and model, or looks it up among the given memoized proofs.
 
+    Parameters:
+        formula: formula whose affirmation or negation is to prove.
+        model: model from whose formulae to prove.
+        value: function from the subformulae of the given formula, and their
+            negations, to their truth values in the given model.
+        proofs: the proofs already found in the given model, by formula, to
+            which the proof of the given formula is added.
 
-    #base case
+    Returns:
+        The proof of the given formula or of its negation.
+    """
+    if formula not in proofs:
+        proofs[formula] = _prove_in_model(formula, model, value, proofs)
+    return proofs[formula]
+
+def _prove_in_model(formula: Formula, model: Model,
+                    value: Callable[[Formula], bool],
+                    proofs: Dict[Formula, Proof]) -> Proof:
+    """Computes the proof returned by `prove_in_model` for the given formula
+    and model, without looking it up among the memoized proofs.
+
+    Parameters:
+        formula: formula whose affirmation or negation is to prove.
+        model: model from whose formulae to prove.
+        value: function from the subformulae of the given formula, and their
+            negations, to their truth values in the given model.
+        proofs: the proofs already found in the given model, by formula.
+
+    Returns:
+        The proof of the given formula or of its negation.
+    """
+    #base case, proved from the formulae capturing the model, as one tuple
+    # shared by all the base cases in the model
     if is_variable(formula.root):
-        if formula in model_use: # assumption
-            return Proof(InferenceRule(model_use, formula), AXIOMATIC_SYSTEM, [Proof.Line(formula)])
+        model_use = _formulae_capturing_items(tuple(sorted(model.items())))
+        if model[formula.root]: # assumption, since it is among model_use
+            return Proof(InferenceRule(model_use, formula), AXIOMATIC_SYSTEM, (Proof.Line(formula),))
         else:
-            return Proof(InferenceRule(model_use, Formula("~", formula)),
-                         AXIOMATIC_SYSTEM, [Proof.Line(Formula("~", formula))])
-
-    if is_unary(formula.root) and is_variable(formula.first.__repr__()):
-        if model[formula.first.__repr__()]:
-            lines = list()
-            lines.append(Proof.Line(formula.first))
-            lines.append(Proof.Line(Formula("->", formula.first, Formula("~", formula)), NN, []))
-            lines.append(Proof.Line(Formula("~", formula), MP, [0,1]))
-            return Proof(InferenceRule(model_use, Formula("~", formula)), AXIOMATIC_SYSTEM, lines)
-        return Proof(InferenceRule(model_use, formula), AXIOMATIC_SYSTEM, [Proof.Line(formula)])
+            return Proof(InferenceRule(model_use, _formula("~", formula)),
+                         AXIOMATIC_SYSTEM, (Proof.Line(_formula("~", formula)),))
+
+    if is_unary(formula.root) and is_variable(formula.first.root):
+        model_use = _formulae_capturing_items(tuple(sorted(model.items())))
+        if model[formula.first.root]:
+            lines = (Proof.Line(formula.first),
+                     Proof.Line(_formula("->", formula.first, _formula("~", formula)), NN, ()),
+                     Proof.Line(_formula("~", formula), MP, (0, 1)))
+            return Proof(InferenceRule(model_use, _formula("~", formula)), AXIOMATIC_SYSTEM, lines)
+        return Proof(InferenceRule(model_use, formula), AXIOMATIC_SYSTEM, (Proof.Line(formula),))
 
     #second case
     if is_unary(formula.root):
-        my_proof = prove_in_model(formula.first, model)
-        if not evaluate(formula, model):
-            return prove_corollary(my_proof, Formula("~", formula), NN)
+        my_proof = _proof_in_model(formula.first, model, value, proofs)
+        if not value(formula):
+            return prove_corollary(my_proof, _formula("~", formula), NN)
         return my_proof
 
     else: # third case -> without ~
-        if evaluate(formula, model): #No negation
-            if not evaluate(formula.first, model): # True if the first is false or the scd is true
-                my_proof = prove_in_model(Formula("~", formula.first), model)
+        if value(formula): #No negation
+            if not value(formula.first): # True if the first is false or the scd is true
+                my_proof = _proof_in_model(_formula("~", formula.first), model, value, proofs)
                 return prove_corollary(my_proof, formula, I2)
-            if evaluate(formula.second, model):
-                return prove_corollary(prove_in_model(formula.second, model), formula, I1)
-        my_proof_left = prove_in_model(formula.first, model)
-        my_proof_right = prove_in_model(formula.second, model)
-        return combine_proofs(my_proof_left, my_proof_right, Formula("~", formula), NI)
+            if value(formula.second):
+                return prove_corollary(_proof_in_model(formula.second, model, value, proofs), formula, I1)
+        my_proof_left = _proof_in_model(formula.first, model, value, proofs)
+        my_proof_right = _proof_in_model(formula.second, model, value, proofs)
+        return combine_proofs(my_proof_left, my_proof_right, _formula("~", formula), NI)
 
 
 def reduce_assumption(proof_from_affirmation: Proof,
@@ -178,20 +256,122 @@ def prove_tautology(tautology: Formula, model: Model = frozendict()) -> Proof:
     assert sorted(tautology.variables())[:len(model)] == sorted(model.keys())
     # Task 6.3a
 
-    variables = tautology.variables()
-    model_variables = model.keys()
+    return _prove_tautology(tautology, model)
+
+def _prove_tautology(tautology: Formula, model: Model,
+                     tables: Optional[Dict[Formula, int]] = None) -> Proof:
+    """Computes the proof returned by `prove_tautology` for the given
+    tautology and model.
+
+    Parameters:
+        tautology: tautology to prove.
+        model: model over a prefix of the variables of the tautology, from
+            whose formulae to prove.
+        tables: the truth tables of the tautology as returned by
+            `_truth_tables`, if already calculated.
+
+    Returns:
+        The proof of the given tautology.
+    """
+    variables = sorted(tautology.variables())
+    unassigned = variables[len(model):]
+    if tables is None:
+        tables = _truth_tables(tautology, variables)
+    # the index among all the models of the first model that extends this one
+    first_index = 0
+    for var in variables[:len(model)]:
+        first_index = 2 * first_index + model[var]
+    first_index <<= len(unassigned)
+
+    # Proofs from the models in the order of all_models, each reduced as soon
+    # as the proof from its negated sibling is done. Every pending proof is
+    # kept with the number of variables already reduced from it.
+    pending = list()
+    for index, values in enumerate(itertools.product([False, True],
+                                                     repeat = len(unassigned))):
+        full_model = dict(model) #getting all the values
+        full_model.update(zip(unassigned, values))
+        value = lambda subformula, index=first_index + index: \
+            _table_value(tables, subformula, index)
+        proof = _proof_in_model(tautology, full_model, value, dict())
+        reduced = 0
+        while len(pending) > 0 and pending[-1][1] == reduced:
+            negation = pending.pop()[0]
+            proof, reduced = reduce_assumption(proof, negation), reduced + 1
+        pending.append((proof, reduced))
+    return pending[0][0]
+
+def _truth_tables(formula: Formula, variables: List[str]) -> Dict[Formula, int]:
+    """Calculates the truth table of each subformula of the given formula.
+
+    Parameters:
+        formula: formula that contains no constants or operators beyond ``'->'``
+            and ``'~'``.
+        variables: the variables of the given formula, sorted.
+
+    Returns:
+        A dictionary mapping each subformula of the given formula to an integer
+        whose `k`\ th bit is set iff the subformula is ``True`` in the `k`\ th
+        model returned by `all_models`\ ``(``\ `variables`\ ``)``.
+    """
+    return _subformula_tables(formula, _variable_masks(variables),
+                              (1 << (1 << len(variables))) - 1)
+
+def _subformula_tables(formula: Formula, masks: Mapping[str, int],
+                       full: int) -> Dict[Formula, int]:
+    """Calculates the truth table of each subformula of the given formula from
+    the truth tables of its variables.
+
+    Parameters:
+        formula: formula that contains no constants or operators beyond ``'->'``
+            and ``'~'``.
+        masks: the truth table of each variable of the given formula.
+        full: the truth table that is ``True`` in all the models.
 
-    if len(variables - model_variables) == 0:
-        return prove_in_model(tautology, model)
+    Returns:
+        A dictionary mapping each subformula of the given formula to its truth
+        table.
+    """
+    tables = dict()
+    stack = [formula]
+    while len(stack) > 0:
+        subformula = stack[-1]
+        if subformula in tables:
+            stack.pop()
+        elif is_variable(subformula.root):
+            tables[subformula] = masks[subformula.root]
+            stack.pop()
+        elif is_unary(subformula.root):
+            if subformula.first in tables:
+                tables[subformula] = full ^ tables[subformula.first]
+                stack.pop()
+            else:
+                stack.append(subformula.first)
+        elif subformula.first in tables and subformula.second in tables:
+            tables[subformula] = \
+                (full ^ tables[subformula.first]) | tables[subformula.second]
+            stack.pop()
+        else:
+            stack.append(subformula.first)
+            stack.append(subformula.second)
+    return tables
 
-    for var in sorted(variables):
-        if var not in sorted(model_variables):
-            aff_model, neg_model = dict(model), dict(model) #getting all the values
-            aff_model[var] = True #updating the dicts to the booleans we need for the values
-            neg_model[var] = False
-            affimation = prove_tautology(tautology, aff_model)
-            negation = prove_tautology(tautology, neg_model)
-            return reduce_assumption(affimation, negation)
+def _table_value(tables: Dict[Formula, int], formula: Formula,
+                 index: int) -> bool:
+    """Looks up the truth value of the given formula in the given model.
+
+    Parameters:
+        tables: truth tables as returned by `_truth_tables`.
+        formula: formula in the given tables, possibly with extra negations.
+        index: index of the model in the order of the truth tables.
+
+    Returns:
+        The truth value of the given formula in the model with the given index.
+    """
+    negations = 0
+    while formula not in tables: # a negation built while proving
+        formula, negations = formula.first, negations + 1
+    return bool(((tables[formula] >> index) ^ negations) & 1)
 
 def proof_or_counterexample(formula: Formula) -> Union[Proof, Model]:
     """Either proves the given formula or finds a model in which it does not
@@ -210,13 +390,16 @@ def proof_or_counterexample(formula: Formula) -> Union[Proof, Model]:
     # Task 6.3b
 
     variables = sorted(formula.variables())
-    models = all_models(variables)
+    tables = _truth_tables(formula, variables)
+    falsifying = tables[formula] ^ ((1 << (1 << len(variables))) - 1)
 
-    for model in models:
-        if not evaluate(formula, model):
-            return model
+    if falsifying != 0: # the lowest set bit is the first falsifying model
+        index = (falsifying & -falsifying).bit_length() - 1
+        return {var: bool((index >> (len(variables) - 1 - position)) & 1)
+                for position, var in enumerate(variables)}
 
-    return prove_tautology(formula)
+    # a tautology, whose truth tables are already known
+    return _prove_tautology(formula, frozendict(), tables)
 
 
 
@@ -240,14 +423,10 @@ def encode_as_formula(rule: InferenceRule) -> Formula:
     """
     # Task 6.4a
 
-    if len(rule.assumptions) == 0:
-        return rule.conclusion
-
-    if len(rule.assumptions) > 1 :
-        new_formula = encode_as_formula(InferenceRule(rule.assumptions[1:], rule.conclusion))
-        return Formula("->", rule.assumptions[0], new_formula)
-
-    return Formula("->", rule.assumptions[0], rule.conclusion) # len == 1
+    new_formula = rule.conclusion
+    for assumption in reversed(rule.assumptions): # innermost first
+        new_formula = _formula("->", assumption, new_formula)
+    return new_formula
 
 def prove_sound_inference(rule: InferenceRule) -> Proof:
     """Proves the given sound inference rule.
@@ -265,20 +444,19 @@ def prove_sound_inference(rule: InferenceRule) -> Proof:
         assert formula.operators().issubset({'->', '~'})
     # Task 6.4b
 
-
-
-    proof_t = prove_tautology(encode_as_formula(rule))
     my_formula = encode_as_formula(rule)
-    lines = list(proof_t.lines)
+    proof_t = prove_tautology(my_formula)
+    base = len(proof_t.lines)
+    Line = Proof.Line
+    tail = list()
 
     for index, ass in enumerate(rule.assumptions):
         my_formula = my_formula.second
-        lines.append(Proof.Line(ass))
-        index_start = len(proof_t.lines) - 1 + 2 * index + 1
-        index_end = len(proof_t.lines) - 1 + 2 * index
-        lines.append(Proof.Line(my_formula, MP, [index_start, index_end]))
+        index_start = base + 2 * index # the line of the assumption
+        tail.append(Line(ass))
+        tail.append(Line(my_formula, MP, (index_start, index_start - 1)))
 
-    return  Proof(rule, AXIOMATIC_SYSTEM, lines)
+    return  Proof(rule, AXIOMATIC_SYSTEM, proof_t.lines + tuple(tail))
 
 def model_or_inconsistency(formulae: List[Formula]) -> Union[Model, Proof]:
     """Either finds a model in which all the given formulae hold, or proves